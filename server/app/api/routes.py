@@ -1,20 +1,26 @@
 """API Routes - Main endpoints for the privacy-aware API gateway."""
 
+import asyncio
+import threading
+from functools import partial
+
+from cachetools import TTLCache, cached
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
 
 from app.core.database import get_db
 from app.core.security import (
     create_access_token,
-    verify_password,
+    verify_password_async,
     get_current_user,
     require_role
 )
 from app.schemas.request_schema import (
     DataAccessRequest,
     DataAccessResponse,
+    RequestCtx,
     AuditLogResponse,
     LoginRequest,
     LoginResponse,
@@ -39,10 +45,30 @@ from app.services.self_destructing_token import self_destructing_token_manager
 from app.services.privacy_budget import privacy_budget_manager
 from app.services.adaptive_masking import adaptive_masking_engine
 from app.services.rtbf_trigger import rtbf_service
-from app.services.legal_compliance import legal_compliance_engine
+from app.services.legal_compliance import legal_compliance_engine, Jurisdiction
 
 router = APIRouter()
 
+# Jurisdiction lookup by value, so invalid input is a dict miss rather than a ValueError
+_JUR_BY_VALUE = {j.value: j for j in Jurisdiction}
+
+
+@cached(
+    TTLCache(maxsize=10_000, ttl=60),
+    key=lambda r: (r.role, r.purpose, r.location, r.data_sensitivity),
+    lock=threading.Lock()
+)
+def _evaluate_policy_memo(request: DataAccessRequest) -> dict:
+    """Policy decisions depend only on role, purpose, location and sensitivity."""
+    return policy_engine.evaluate_policy(request)
+
+
+def _evaluate_policy_cached(request: DataAccessRequest) -> dict:
+    """Cached policy decision, copied so callers never share a cache entry."""
+    result = _evaluate_policy_memo(request)
+    return {**result, "checks": dict(result["checks"])}
+
+
 # Demo users with Indian names and profiles
 # Passwords: Use the username + "123" (e.g., rajat123, priya123)
 MOCK_USERS = {
@@ -93,6 +119,12 @@ MOCK_USERS = {
     }
 }
 
+# Login lookup table built once at import: username -> (role, bcrypt hash bytes)
+_LOGIN_TABLE = {
+    username: (user["role"], user["password"].encode("utf-8"))
+    for username, user in MOCK_USERS.items()
+}
+
 
 @router.get("/health")
 async def health_check():
@@ -138,31 +170,35 @@ async def list_users(current_user: dict = Depends(get_current_user)):
 @router.post("/auth/login", response_model=LoginResponse)
 async def login(login_data: LoginRequest):
     """User login endpoint with JWT token generation."""
-    user = MOCK_USERS.get(login_data.username)
+    entry = _LOGIN_TABLE.get(login_data.username)
     
-    if not user or not verify_password(login_data.password, user["password"]):
+    if entry is None or not await verify_password_async(login_data.password, entry[1]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token = create_access_token(
-        data={"sub": user["username"], "role": user["role"]},
+    role = entry[0]
+    
+    # JWT signing is CPU-bound; keep it off the event loop
+    loop = asyncio.get_running_loop()
+    access_token = await loop.run_in_executor(None, partial(
+        create_access_token,
+        data={"sub": login_data.username, "role": role},
         expires_delta=timedelta(minutes=30)
-    )
+    ))
     
     return LoginResponse(
         access_token=access_token,
         token_type="bearer",
-        role=user["role"]
+        role=role
     )
 
 
 @router.post("/request-data", response_model=DataAccessResponse)
 async def request_data_access(
     request: DataAccessRequest,
-    db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """
@@ -175,42 +211,30 @@ async def request_data_access(
     
     Returns ALLOW or DENY decision with reason and risk score.
     """
-    request_dict = {
-        "requester_id": request.requester_id,
-        "role": request.role,
-        "purpose": request.purpose,
-        "location": request.location,
-        "data_sensitivity": request.data_sensitivity
-    }
-    
-    policy_result = policy_engine.evaluate_policy(request_dict)
-    
-    consent_result = consent_manager.check_consent(request_dict)
-    
-    risk_result = risk_engine.assess_risk(request_dict)
-    
-    final_decision = "DENY"
-    reasons = []
-    
-    if not policy_result["allowed"]:
-        reasons.append(f"Policy: {policy_result['reason']}")
-    
-    if not consent_result["has_consent"]:
-        reasons.append(f"Consent: {consent_result['reason']}")
+    # Independent checks run concurrently on the default threadpool
+    loop = asyncio.get_running_loop()
+    policy_result, consent_result, risk_result = await asyncio.gather(
+        loop.run_in_executor(None, _evaluate_policy_cached, request),
+        loop.run_in_executor(None, consent_manager.check_consent, request),
+        loop.run_in_executor(None, risk_engine.assess_risk, request)
+    )
     
-    if risk_result["exceeds_threshold"]:
-        reasons.append(
-            f"Risk: Score {risk_result['risk_score']} exceeds threshold {risk_result['threshold']}"
-        )
+    # Fixed slots, one per check; passing checks leave None and are skipped in the join
+    reasons = (
+        None if policy_result["allowed"] else f"Policy: {policy_result['reason']}",
+        None if consent_result["has_consent"] else f"Consent: {consent_result['reason']}",
+        f"Risk: Score {risk_result['risk_score']} exceeds threshold {risk_result['threshold']}"
+        if risk_result["exceeds_threshold"] else None
+    )
     
-    if policy_result["allowed"] and consent_result["has_consent"] and not risk_result["exceeds_threshold"]:
+    if any(reasons):
+        final_decision = "DENY"
+        final_reason = " | ".join(r for r in reasons if r)
+    else:
         final_decision = "ALLOW"
-        reasons.append("All checks passed: policy compliant, consent granted, risk acceptable")
+        final_reason = "All checks passed: policy compliant, consent granted, risk acceptable"
     
-    final_reason = " | ".join(reasons)
-    
-    audit_logger.log_request(
-        db=db,
+    audit_logger.enqueue_request(
         requester_id=request.requester_id,
         requester_role=request.role,
         purpose=request.purpose,
@@ -237,11 +261,13 @@ async def request_data_access(
 
 
 @router.get("/audit-logs", response_model=List[AuditLogResponse])
-async def get_audit_logs(
+def get_audit_logs(
     limit: int = Query(default=100, le=1000),
     offset: int = Query(default=0, ge=0),
     requester_id: Optional[str] = None,
     decision: Optional[str] = None,
+    before: Optional[datetime] = None,
+    before_id: Optional[int] = None,
     db: Session = Depends(get_db),
     current_user: dict = Depends(require_role("admin"))
 ):
@@ -253,20 +279,23 @@ async def get_audit_logs(
     - offset: Number of logs to skip (default: 0)
     - requester_id: Filter by requester ID
     - decision: Filter by decision (ALLOW/DENY)
+    - before / before_id: Timestamp and id of the last log on the previous page (keyset pagination)
     """
     logs = audit_logger.get_audit_logs(
         db=db,
         limit=limit,
         offset=offset,
         requester_id=requester_id,
-        decision=decision
+        decision=decision,
+        before=before,
+        before_id=before_id
     )
     
     return logs
 
 
 @router.get("/audit-logs/stats")
-async def get_audit_stats(
+def get_audit_stats(
     db: Session = Depends(get_db),
     current_user: dict = Depends(require_role("admin"))
 ):
@@ -321,7 +350,7 @@ async def signal_task_complete(
 
 
 @router.get("/tokens/status/{token_id}")
-async def get_token_status(
+def get_token_status(
     token_id: str,
     current_user: dict = Depends(get_current_user)
 ):
@@ -330,7 +359,7 @@ async def get_token_status(
 
 
 @router.get("/tokens/active")
-async def get_active_tokens(
+def get_active_tokens(
     current_user: dict = Depends(get_current_user)
 ):
     """Get all active tokens for the current user."""
@@ -388,7 +417,7 @@ async def set_custom_budget(
 
 
 @router.get("/privacy-budget/history/{subject_id}")
-async def get_budget_history(
+def get_budget_history(
     subject_id: str,
     limit: int = Query(default=50, le=200),
     current_user: dict = Depends(require_role("admin"))
@@ -398,7 +427,7 @@ async def get_budget_history(
 
 
 @router.get("/privacy-budget/all")
-async def get_all_budgets(
+def get_all_budgets(
     current_user: dict = Depends(require_role("admin"))
 ):
     """Get summary of all privacy budgets (admin only)."""
@@ -423,27 +452,35 @@ async def apply_adaptive_masking(
     - Data sensitivity
     - Field types (email, SSN, phone, etc.)
     """
+    user_sub = current_user.get("sub")
+    user_role = current_user.get("role")
+    
+    # Masking depends on the risk score, so both steps run in order off the event loop
+    loop = asyncio.get_running_loop()
+    
     # Calculate risk score for the requester
-    risk_result = risk_engine.assess_risk({
-        "role": current_user.get("role"),
-        "purpose": request.purpose,
-        "location": "US",  # Default, can be enhanced
-        "data_sensitivity": "medium"
-    })
-    
-    result = adaptive_masking_engine.mask_data(
+    risk_result = await loop.run_in_executor(None, risk_engine.assess_risk, RequestCtx(
+        requester_id=user_sub,
+        role=user_role,
+        purpose=request.purpose,
+        location="US",  # Default, can be enhanced
+        data_sensitivity="medium"
+    ))
+    
+    result = await loop.run_in_executor(None, partial(
+        adaptive_masking_engine.mask_data,
         data=request.data,
         field_types=request.field_types,
         risk_score=risk_result["risk_score"],
-        requester_id=current_user.get("sub"),
+        requester_id=user_sub,
         purpose=request.purpose
-    )
+    ))
     
     return MaskDataResponse(**result)
 
 
 @router.get("/masking/stats")
-async def get_masking_stats(
+def get_masking_stats(
     current_user: dict = Depends(require_role("admin"))
 ):
     """Get adaptive masking statistics (admin only)."""
@@ -465,7 +502,7 @@ async def trigger_rtbf(
     Immediately blocks access and initiates automated data purging
     across all data layers when a user withdraws consent.
     """
-    result = rtbf_service.trigger_rtbf(
+    result = await rtbf_service.trigger_rtbf(
         subject_id=request.subject_id,
         requested_by=current_user.get("sub"),
         reason=request.reason,
@@ -485,7 +522,7 @@ async def trigger_rtbf(
 
 
 @router.get("/rtbf/status/{request_id}")
-async def get_rtbf_status(
+def get_rtbf_status(
     request_id: str,
     current_user: dict = Depends(get_current_user)
 ):
@@ -497,7 +534,7 @@ async def get_rtbf_status(
 
 
 @router.get("/rtbf/certificate/{subject_id}")
-async def get_deletion_certificate(
+def get_deletion_certificate(
     subject_id: str,
     current_user: dict = Depends(get_current_user)
 ):
@@ -509,7 +546,7 @@ async def get_deletion_certificate(
 
 
 @router.get("/rtbf/blocked/{subject_id}")
-async def check_rtbf_block(
+def check_rtbf_block(
     subject_id: str,
     current_user: dict = Depends(get_current_user)
 ):
@@ -521,7 +558,7 @@ async def check_rtbf_block(
 
 
 @router.get("/rtbf/all")
-async def get_all_rtbf_requests(
+def get_all_rtbf_requests(
     status: Optional[str] = None,
     current_user: dict = Depends(require_role("admin"))
 ):
@@ -560,7 +597,7 @@ async def check_legal_compliance(
 
 
 @router.get("/compliance/laws")
-async def get_all_laws(
+def get_all_laws(
     current_user: dict = Depends(get_current_user)
 ):
     """Get summary of all supported privacy laws."""
@@ -573,8 +610,6 @@ async def get_applicable_laws(
     current_user: dict = Depends(get_current_user)
 ):
     """Get applicable laws based on controller and subject locations."""
-    from app.services.legal_compliance import Jurisdiction
-    
     controller_loc = payload.get("data_controller_location", "US")
     subject_loc = payload.get("data_subject_location", "US")
     
@@ -653,25 +688,23 @@ async def get_merged_requirements(
 
 
 @router.get("/compliance/law/{jurisdiction}")
-async def get_law_details(
+def get_law_details(
     jurisdiction: str,
     current_user: dict = Depends(get_current_user)
 ):
     """Get detailed information about a specific privacy law."""
-    from app.services.legal_compliance import Jurisdiction
-    
-    try:
-        j = Jurisdiction(jurisdiction)
-        details = legal_compliance_engine.get_law_details(j)
-        if not details:
-            raise HTTPException(status_code=404, detail="Law not found")
-        return details
-    except ValueError:
+    j = _JUR_BY_VALUE.get(jurisdiction)
+    if j is None:
         raise HTTPException(status_code=400, detail=f"Invalid jurisdiction: {jurisdiction}")
+    
+    details = legal_compliance_engine.get_law_details(j)
+    if not details:
+        raise HTTPException(status_code=404, detail="Law not found")
+    return details
 
 
 @router.get("/compliance/report")
-async def get_compliance_report(
+def get_compliance_report(
     limit: int = Query(default=50, le=200),
     current_user: dict = Depends(require_role("admin"))
 ):
@@ -683,10 +716,125 @@ async def get_compliance_report(
 # ENHANCED REQUEST-DATA WITH ALL PRIVACY FEATURES
 # ============================================================================
 
+def _compliance_failure(result: dict) -> Optional[str]:
+    """Return the first blocking legal issue, if any."""
+    if result["is_compliant"]:
+        return None
+    
+    blocking_issues = [i for i in result["compliance_issues"]
+                       if i.get("severity") == "blocking"]
+    if blocking_issues:
+        return f"Legal: {blocking_issues[0]['message']}"
+    return "Legal: Request is not compliant"
+
+
+# Placeholders for checks skipped because an earlier gate already denied;
+# compliance is unknown rather than passed, so the audit row records None
+_BUDGET_NOT_EVALUATED = {"allowed": True, "reason": "not_evaluated"}
+_COMPLIANCE_NOT_EVALUATED = {"is_compliant": None, "reason": "not_evaluated"}
+
+
+def _run_checks(checks, results: Dict[str, dict], reasons: List[str], diagnostic: bool):
+    """Run (name, check, failure) entries in order, stopping at the first failure unless diagnostic."""
+    for name, check, failure in checks:
+        results[name] = check()
+        reason = failure(results[name])
+        if reason:
+            reasons.append(reason)
+            if not diagnostic:
+                return
+
+
+def _run_gating_checks(
+    request: DataAccessRequest,
+    diagnostic: bool
+) -> Tuple[Dict[str, dict], List[str]]:
+    """Run the side-effect free policy, consent and risk checks."""
+    checks = (
+        (
+            "policy",
+            partial(_evaluate_policy_cached, request),
+            lambda r: None if r["allowed"] else f"Policy: {r['reason']}"
+        ),
+        (
+            "consent",
+            partial(consent_manager.check_consent, request),
+            lambda r: None if r["has_consent"] else f"Consent: {r['reason']}"
+        ),
+        (
+            "risk",
+            partial(risk_engine.assess_risk, request),
+            lambda r: f"Risk: Score {r['risk_score']} exceeds threshold" if r["exceeds_threshold"] else None
+        )
+    )
+    
+    results = {}
+    reasons = []
+    _run_checks(checks, results, reasons, diagnostic)
+    return results, reasons
+
+
+def _run_enhanced_checks(
+    request: DataAccessRequest,
+    requester_sub: str,
+    diagnostic: bool
+) -> Tuple[Dict[str, dict], List[str]]:
+    """
+    Run the enhanced gateway checks in order, cheapest first.
+    
+    Stops at the first failing check unless diagnostic is set, in which
+    case every check runs and all failure reasons are collected. Privacy
+    budget and legal compliance are never evaluated once policy or consent
+    has denied the request, so denied requests do not consume budget.
+    """
+    results, reasons = _run_gating_checks(request, diagnostic)
+    
+    # The risk score is always reported, even when an earlier check stopped the
+    # chain; scored here so the engine call stays off the event loop
+    if "risk" not in results:
+        results["risk"] = risk_engine.assess_risk(request)
+    
+    if reasons and not diagnostic:
+        return results, reasons
+    
+    if not (results["policy"]["allowed"] and results["consent"]["has_consent"]):
+        results["budget"] = _BUDGET_NOT_EVALUATED
+        results["compliance"] = _COMPLIANCE_NOT_EVALUATED
+        return results, reasons
+    
+    checks = (
+        (
+            "budget",
+            partial(
+                privacy_budget_manager.check_and_consume_budget,
+                subject_id=request.requester_id,
+                requester_id=requester_sub,
+                query_type="individual",
+                data_sensitivity=request.data_sensitivity,
+                purpose=request.purpose
+            ),
+            lambda r: None if r["allowed"] else f"Privacy Budget: {r['reason']}"
+        ),
+        (
+            "compliance",
+            partial(
+                legal_compliance_engine.evaluate_compliance,
+                request=RequestCtx.from_request(request),
+                data_subject_location=request.location,
+                requester_location="US"  # Could be enhanced with user location
+            ),
+            _compliance_failure
+        )
+    )
+    
+    _run_checks(checks, results, reasons, diagnostic)
+    return results, reasons
+
+
 @router.post("/request-data/enhanced", response_model=DataAccessResponse)
 async def request_data_access_enhanced(
     request: DataAccessRequest,
-    db: Session = Depends(get_db),
+    diagnostic: bool = Query(default=False, description="Run every check and report all failures (admin only)"),
     current_user: dict = Depends(get_current_user)
 ):
     """
@@ -699,14 +847,12 @@ async def request_data_access_enhanced(
     5. Legal Compliance - Multi-jurisdiction law enforcement
     6. Adaptive Masking - Risk-based data anonymization
     7. RTBF Check - Right to Be Forgotten verification
+    
+    Checks run in order and the request is denied at the first failure.
+    Admins can pass diagnostic=true to run every check and see all reasons.
     """
-    request_dict = {
-        "requester_id": request.requester_id,
-        "role": request.role,
-        "purpose": request.purpose,
-        "location": request.location,
-        "data_sensitivity": request.data_sensitivity
-    }
+    user_sub = current_user.get("sub")
+    user_role = current_user.get("role")
     
     # Check RTBF block first
     if rtbf_service.is_subject_blocked(request.requester_id):
@@ -718,66 +864,30 @@ async def request_data_access_enhanced(
             consent_status={"has_consent": False, "reason": "RTBF active"}
         )
     
-    # Standard checks
-    policy_result = policy_engine.evaluate_policy(request_dict)
-    consent_result = consent_manager.check_consent(request_dict)
-    risk_result = risk_engine.assess_risk(request_dict)
-    
-    # Privacy budget check
-    budget_result = privacy_budget_manager.check_and_consume_budget(
-        subject_id=request.requester_id,
-        requester_id=current_user.get("sub"),
-        query_type="individual",
-        data_sensitivity=request.data_sensitivity,
-        purpose=request.purpose
-    )
+    loop = asyncio.get_running_loop()
+    results, reasons = await loop.run_in_executor(None, partial(
+        _run_enhanced_checks,
+        request,
+        user_sub,
+        diagnostic and user_role == "admin"
+    ))
     
-    # Legal compliance check
-    compliance_result = legal_compliance_engine.evaluate_compliance(
-        request=request_dict,
-        data_subject_location=request.location,
-        requester_location="US"  # Could be enhanced with user location
-    )
+    policy_result = results["policy"]
+    consent_result = results.get("consent", {"has_consent": False, "reason": "not_evaluated"})
+    budget_result = results.get("budget", _BUDGET_NOT_EVALUATED)
+    compliance_result = results.get("compliance", _COMPLIANCE_NOT_EVALUATED)
+    risk_result = results["risk"]
     
     final_decision = "DENY"
-    reasons = []
-    
-    if not policy_result["allowed"]:
-        reasons.append(f"Policy: {policy_result['reason']}")
-    
-    if not consent_result["has_consent"]:
-        reasons.append(f"Consent: {consent_result['reason']}")
-    
-    if risk_result["exceeds_threshold"]:
-        reasons.append(f"Risk: Score {risk_result['risk_score']} exceeds threshold")
-    
-    if not budget_result["allowed"]:
-        reasons.append(f"Privacy Budget: {budget_result['reason']}")
     
-    if not compliance_result["is_compliant"]:
-        blocking_issues = [i for i in compliance_result["compliance_issues"] 
-                         if i.get("severity") == "blocking"]
-        if blocking_issues:
-            reasons.append(f"Legal: {blocking_issues[0]['message']}")
-    
-    # All checks must pass
-    all_passed = (
-        policy_result["allowed"] and 
-        consent_result["has_consent"] and 
-        not risk_result["exceeds_threshold"] and
-        budget_result["allowed"] and
-        compliance_result["is_compliant"]
-    )
-    
-    if all_passed:
+    if not reasons:
         final_decision = "ALLOW"
         reasons.append("All privacy checks passed")
     
     final_reason = " | ".join(reasons)
     
-    # Log the request
-    audit_logger.log_request(
-        db=db,
+    # Queue the request for the background audit flusher
+    audit_logger.enqueue_request(
         requester_id=request.requester_id,
         requester_role=request.role,
         purpose=request.purpose,
@@ -1,13 +1,30 @@
 """Database configuration and session management."""
 
-from sqlalchemy import create_engine
+import orjson
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import get_settings
 
 settings = get_settings()
 
-engine = create_engine(settings.database_url, pool_pre_ping=True)
+
+def _json_serializer(obj) -> str:
+    """Serialize JSON columns (e.g. audit request_metadata) with orjson."""
+    return orjson.dumps(obj).decode()
+
+
+engine = create_engine(
+    settings.database_url,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=True,
+    query_cache_size=settings.db_query_cache_size,
+    json_serializer=_json_serializer,
+    json_deserializer=orjson.loads
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -23,5 +40,25 @@ def get_db():
 
 
 def init_db():
-    """Initialize database tables."""
+    """Initialize database tables, and add indexes missing from existing ones."""
     Base.metadata.create_all(bind=engine)
+    
+    # create_all skips tables that already exist, so indexes added to a model
+    # later would never reach a database created before them
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def warm_connection_pool():
+    """Open pool_size connections up front so early requests skip the connect handshake."""
+    connections = []
+    try:
+        # Hold every connection until all are open, otherwise the pool reuses the first one
+        for _ in range(settings.db_pool_size):
+            connection = engine.connect()
+            connections.append(connection)
+            connection.execute(text("SELECT 1"))
+    finally:
+        for connection in connections:
+            connection.close()
@@ -1,7 +1,19 @@
-from datetime import datetime, timedelta
+from collections import OrderedDict
+import asyncio
+import base64
+import binascii
+from datetime import timedelta
 from typing import Optional
-from jose import JWTError, jwt
+import hashlib
+import hmac
+import threading
+import time
+import orjson
+from cachetools import TTLCache
+import jwt
 import bcrypt
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from app.core.config import get_settings
@@ -9,42 +21,187 @@ from app.core.config import get_settings
 security = HTTPBearer()
 settings = get_settings()
 
+# Token settings bound once; they never change while the process runs
+_SECRET = settings.secret_key.encode("utf-8")
+_ALG = settings.algorithm
+_EXP_SECONDS = settings.access_token_expire_minutes * 60
+
+# HMAC algorithms signed directly; the header segment never changes, so it is encoded once
+_HMAC_DIGESTS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+_HMAC_DIGEST = _HMAC_DIGESTS.get(_ALG)
+_HEADER_SEGMENT = base64.urlsafe_b64encode(
+    orjson.dumps({"alg": _ALG, "typ": "JWT"})
+).rstrip(b"=")
+
+# Argon2id at the OWASP baseline (46 MiB, t=3, p=1); bcrypt hashes still verify
+_password_hasher = PasswordHasher(time_cost=3, memory_cost=47104, parallelism=1)
+_ARGON2_PREFIX = "$argon2"
+
+# Successful (stored hash, sha256(password)) verifications, most recent last
+_VERIFIED_PASSWORDS_MAX = 1024
+_verified_passwords: "OrderedDict[tuple, bool]" = OrderedDict()
+_verified_passwords_lock = threading.Lock()
+
+# Roles that pass every require_role check
+_ADMIN_ROLES = frozenset({"admin"})
+
+# Decoded payloads of recently verified tokens; never outlive the token's own exp
+_verified_tokens: TTLCache = TTLCache(maxsize=10_000, ttl=10)
+_verified_tokens_lock = threading.Lock()
+
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token."""
     to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=settings.access_token_expire_minutes)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
-    return encoded_jwt
+    expires_in = int(expires_delta.total_seconds()) if expires_delta else _EXP_SECONDS
+    to_encode["exp"] = int(time.time()) + expires_in
+    return encode_token(to_encode)
 
 
-def verify_token(token: str) -> Optional[dict]:
-    """Verify and decode a JWT token."""
+def encode_token(claims: dict) -> str:
+    """Sign JSON-serializable claims as a JWT, directly for HMAC algorithms and via PyJWT otherwise."""
+    if _HMAC_DIGEST is None:
+        return jwt.encode(claims, _SECRET, algorithm=_ALG)
+    
+    signing_input = _HEADER_SEGMENT + b"." + base64.urlsafe_b64encode(orjson.dumps(claims)).rstrip(b"=")
+    signature = base64.urlsafe_b64encode(hmac.new(_SECRET, signing_input, _HMAC_DIGEST).digest()).rstrip(b"=")
+    return (signing_input + b"." + signature).decode("ascii")
+
+
+def _b64url_decode(segment: bytes) -> bytes:
+    """Decode an unpadded base64url segment."""
+    return base64.urlsafe_b64decode(segment + b"=" * (-len(segment) % 4))
+
+
+def _verify_hmac_token(token: str) -> Optional[dict]:
+    """
+    Verify a token carrying our own HMAC header without going through PyJWT.
+    
+    The signature is checked before the claims are parsed, so forged tokens
+    are rejected after a single HMAC. Tokens with any other header fall back
+    to jwt.decode.
+    """
+    try:
+        signing_input, signature = token.encode("ascii").rsplit(b".", 1)
+        header, claims = signing_input.split(b".")
+    except (UnicodeEncodeError, ValueError):
+        return None
+    
+    if header != _HEADER_SEGMENT:
+        return _decode_with_pyjwt(token)
+    
+    expected = hmac.new(_SECRET, signing_input, _HMAC_DIGEST).digest()
+    try:
+        if not hmac.compare_digest(_b64url_decode(signature), expected):
+            return None
+        payload = orjson.loads(_b64url_decode(claims))
+    except (binascii.Error, orjson.JSONDecodeError):
+        return None
+    
+    if not isinstance(payload, dict):
+        return None
+    
+    exp = payload.get("exp")
+    if not isinstance(exp, (int, float)) or exp <= time.time():
+        return None
+    
+    return payload
+
+
+def _decode_with_pyjwt(token: str) -> Optional[dict]:
+    """Verify and decode a JWT token with PyJWT."""
     try:
-        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+        return jwt.decode(
+            token,
+            _SECRET,
+            algorithms=[_ALG],
+            options={"require": ["exp"]}
+        )
+    except jwt.InvalidTokenError:
+        return None
+
+
+def verify_token(token: str) -> Optional[dict]:
+    """Verify and decode a JWT token, reusing the result for recently seen tokens."""
+    with _verified_tokens_lock:
+        payload = _verified_tokens.get(token)
+    
+    if payload is not None and payload["exp"] > time.time():
         return payload
-    except JWTError:
+    
+    if _HMAC_DIGEST is not None:
+        payload = _verify_hmac_token(token)
+    else:
+        payload = _decode_with_pyjwt(token)
+    
+    if payload is None:
         return None
+    
+    with _verified_tokens_lock:
+        _verified_tokens[token] = payload
+    
+    return payload
 
 
 def hash_password(password: str) -> str:
-    """Hash a password using bcrypt."""
-    password_bytes = password.encode('utf-8')
-    salt = bcrypt.gensalt(rounds=12)
-    return bcrypt.hashpw(password_bytes, salt).decode('utf-8')
+    """Hash a password using Argon2id."""
+    return _password_hasher.hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash."""
+    """Verify a password against an Argon2id or legacy bcrypt hash."""
+    if hashed_password.startswith(_ARGON2_PREFIX):
+        try:
+            return _password_hasher.verify(hashed_password, plain_password)
+        except (VerificationError, InvalidHashError):
+            return False
+    
     password_bytes = plain_password.encode('utf-8')
     hashed_bytes = hashed_password.encode('utf-8')
     return bcrypt.checkpw(password_bytes, hashed_bytes)
 
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Check whether a stored hash is bcrypt or uses outdated Argon2 parameters."""
+    if not hashed_password.startswith(_ARGON2_PREFIX):
+        return True
+    return _password_hasher.check_needs_rehash(hashed_password)
+
+
+def verify_password_cached(plain_password: str, hashed_password: bytes) -> bool:
+    """Verify a password against a pre-encoded hash, skipping the hash for recently verified credentials."""
+    password_bytes = plain_password.encode('utf-8')
+    key = (hashed_password, hashlib.sha256(password_bytes).digest())
+    
+    with _verified_passwords_lock:
+        if key in _verified_passwords:
+            _verified_passwords.move_to_end(key)
+            return True
+    
+    # Only successful checks are cached; failures always pay the full cost
+    if not verify_password(plain_password, hashed_password.decode('utf-8')):
+        return False
+    
+    with _verified_passwords_lock:
+        _verified_passwords[key] = True
+        if len(_verified_passwords) > _VERIFIED_PASSWORDS_MAX:
+            _verified_passwords.popitem(last=False)
+    
+    return True
+
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password on the default executor so hashing does not block the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: bytes) -> bool:
+    """Run verify_password_cached on the default executor so hashing does not block the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, verify_password_cached, plain_password, hashed_password)
+
+
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
     """Get current user from JWT token."""
     token = credentials.credentials
@@ -62,11 +219,10 @@ def require_role(required_role: str):
     """Dependency to require a specific role."""
     def role_checker(user: dict = Depends(get_current_user)) -> dict:
         user_role = user.get("role")
-        if user_role not in ["admin"] and user_role != required_role:
-            if required_role != user_role:
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail=f"Insufficient permissions. Required role: {required_role}"
-                )
+        if user_role not in _ADMIN_ROLES and user_role != required_role:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"Insufficient permissions. Required role: {required_role}"
+            )
         return user
     return role_checker
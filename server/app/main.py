@@ -1,17 +1,35 @@
+from typing import Any
+import orjson
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.api.routes import router
-from app.core.database import init_db
+from app.core.config import get_settings
+from app.core.database import init_db, warm_connection_pool
+from app.services.audit_logger import audit_logger
+from app.services.self_destructing_token import self_destructing_token_manager
 
+
+class OrjsonResponse(JSONResponse):
+    """JSON response rendered with orjson instead of the stdlib json module."""
+    
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+# Routes with a response_model are still serialized by pydantic directly
 app = FastAPI(
     title="Privy API",
     version="1.0.0",
+    default_response_class=OrjsonResponse,
 )
 
-# 🚨 NUCLEAR CORS (FOR DEV ONLY)
+settings = get_settings()
+
+# 🚨 NUCLEAR CORS only in debug; otherwise just the configured frontend origins
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],          # ← NO guessing, allow EVERYTHING
+    allow_origins=["*"] if settings.debug else frozenset(settings.cors_origins),  # set: O(1) origin checks
     allow_credentials=False,      # must be False when allow_origins=["*"]
     allow_methods=["*"],
     allow_headers=["*"],
@@ -23,7 +41,24 @@ app.include_router(router, prefix="/api")
 @app.on_event("startup")
 def startup():
     init_db()
+    warm_connection_pool()
+
+@app.on_event("startup")
+async def start_audit_flusher():
+    audit_logger.start()
+
+@app.on_event("startup")
+async def start_token_sweeper():
+    self_destructing_token_manager.start_sweeper()
+
+@app.on_event("shutdown")
+async def stop_audit_flusher():
+    await audit_logger.stop()
+
+@app.on_event("shutdown")
+async def stop_token_sweeper():
+    await self_destructing_token_manager.stop_sweeper()
 
 @app.get("/")
-def root():
+async def root():
     return {"status": "ok"}
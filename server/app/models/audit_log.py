@@ -1,7 +1,7 @@
 """Audit Log Model - Database model for audit logging."""
 
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Float, Text, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Float, Text, JSON, Index
 from app.core.database import Base
 
 
@@ -9,10 +9,18 @@ class AuditLog(Base):
     """Audit log database model."""
     
     __tablename__ = "audit_logs"
+    __table_args__ = (
+        # Serve the newest-first listings in get_audit_logs, unfiltered and filtered
+        Index("ix_audit_timestamp_id", "timestamp", "id"),
+        Index("ix_audit_requester_timestamp", "requester_id", "timestamp"),
+        Index("ix_audit_decision_timestamp", "decision", "timestamp"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
+    # Stamped in Python (naive UTC) on every insert path; a server default would not
+    # reach tables created before it, and now() follows the session time zone
     timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
-    requester_id = Column(String(255), nullable=False, index=True)
+    requester_id = Column(String(255), nullable=False)
     requester_role = Column(String(50), nullable=False)
     purpose = Column(String(255), nullable=False)
     location = Column(String(255))
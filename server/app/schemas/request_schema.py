@@ -1,8 +1,9 @@
 """Request Schemas - Pydantic schemas for API request/response validation."""
 
-from datetime import datetime
+from dataclasses import dataclass
+from datetime import datetime, timezone
 from typing import Optional, List, Dict, Any
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class DataAccessRequest(BaseModel):
@@ -15,13 +16,44 @@ class DataAccessRequest(BaseModel):
     data_sensitivity: str = Field(..., description="Sensitivity level of requested data (low, medium, high)")
 
 
+@dataclass(slots=True, frozen=True)
+class RequestCtx:
+    """
+    Internal, hashable request context for callers without a DataAccessRequest.
+    
+    Carries the same attributes the engines read, and a dict-style get()
+    for the compliance engine, which also accepts plain request dicts.
+    """
+    
+    requester_id: str
+    role: str
+    purpose: str
+    location: str
+    data_sensitivity: str
+    
+    @classmethod
+    def from_request(cls, request: DataAccessRequest) -> "RequestCtx":
+        """Build a context from a validated API request."""
+        return cls(
+            requester_id=request.requester_id,
+            role=request.role,
+            purpose=request.purpose,
+            location=request.location,
+            data_sensitivity=request.data_sensitivity
+        )
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        """Dict-compatible field access."""
+        return getattr(self, key, default)
+
+
 class DataAccessResponse(BaseModel):
     """Schema for data access response."""
     
     decision: str = Field(..., description="Final decision: ALLOW or DENY")
     reason: str = Field(..., description="Reason for the decision")
     risk_score: float = Field(..., description="Risk score between 0 and 1")
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     policy_checks: Dict[str, Any] = Field(default_factory=dict)
     consent_status: Dict[str, Any] = Field(default_factory=dict)
     privacy_budget: Optional[Dict[str, Any]] = Field(default=None, description="Privacy budget status")
@@ -32,6 +64,8 @@ class DataAccessResponse(BaseModel):
 class AuditLogResponse(BaseModel):
     """Schema for audit log response."""
     
+    model_config = ConfigDict(from_attributes=True)
+    
     id: int
     timestamp: datetime
     requester_id: str
@@ -43,9 +77,6 @@ class AuditLogResponse(BaseModel):
     reason: Optional[str]
     risk_score: float
     request_metadata: Optional[Dict[str, Any]]
-    
-    class Config:
-        from_attributes = True
 
 
 class LoginRequest(BaseModel):
@@ -5,12 +5,35 @@ Automatically swaps real data for synthetic or anonymized data
 based on the requester's risk level and data sensitivity.
 """
 
-from datetime import datetime, date
-from typing import Dict, Any, List, Optional
+from collections import Counter, deque
+from datetime import datetime, date, timedelta
+from typing import Deque, Dict, Any, List, Optional, Tuple
+import bisect
 import hashlib
 import random
 import string
 import re
+import socket
+import threading
+import time
+from app.core.config import get_settings
+
+settings = get_settings()
+
+
+_YEAR_RE = re.compile(r'\d{4}')
+_NON_NUMERIC_RE = re.compile(r'[^\d.]')
+
+# Age range buckets: an age below _AGE_BOUNDS[i] falls in _AGE_LABELS[i]
+_AGE_BOUNDS = (18, 30, 45, 60)
+_AGE_LABELS = ("Under 18", "18-29", "30-44", "45-59", "60+")
+
+# BLAKE2b key for pseudonyms, derived from the app secret so they cannot be
+# recomputed without it (hashed to fit BLAKE2b's 64-byte key limit)
+_PSEUDONYM_KEY = hashlib.sha256(b"pseudonym:" + settings.secret_key.encode()).digest()
+
+# Naive UTC epoch used to render log timestamps
+_EPOCH = datetime(1970, 1, 1)
 
 
 class AdaptiveMaskingEngine:
@@ -31,6 +54,10 @@ class AdaptiveMaskingEngine:
         "full": {"min_risk": 0.8, "max_risk": 1.0}       # Synthetic data only
     }
     
+    # Level names and the upper bounds between them, for bisect lookup
+    LEVEL_NAMES = tuple(MASKING_LEVELS)
+    LEVEL_BOUNDS = tuple(t["max_risk"] for t in MASKING_LEVELS.values())[:-1]
+    
     # Field-specific masking strategies
     MASKING_STRATEGIES = {
         "email": ["hash", "domain_only", "synthetic", "redact"],
@@ -47,43 +74,83 @@ class AdaptiveMaskingEngine:
     }
     
     # Synthetic data generators
-    SYNTHETIC_NAMES = [
+    SYNTHETIC_NAMES: Tuple[str, ...] = (
         "Alex Johnson", "Jordan Smith", "Casey Williams", "Morgan Brown",
         "Riley Davis", "Quinn Miller", "Avery Wilson", "Cameron Moore"
-    ]
+    )
+    
+    SYNTHETIC_DOMAINS: Tuple[str, ...] = ("example.com", "test.org", "demo.net", "sample.io")
     
-    SYNTHETIC_DOMAINS = ["example.com", "test.org", "demo.net", "sample.io"]
+    # Index into a field's strategy list for each masking level (-1 = no masking)
+    LEVEL_TO_INDEX = {
+        "none": -1,
+        "light": 0,
+        "moderate": 1,
+        "heavy": 2,
+        "full": 3
+    }
     
-    def __init__(self):
-        self.masking_log: List[Dict] = []
+    # Number of masking operations kept in the in-memory log
+    MASKING_LOG_SIZE = 1000
+    
+    def __init__(self, seed: Optional[int] = None):
+        self.masking_log: Deque[Dict] = deque(maxlen=self.MASKING_LOG_SIZE)
+        
+        # Per-level counts of the entries currently in masking_log
+        self._level_counts: Counter = Counter()
+        self._log_lock = threading.Lock()
+        
+        # Dedicated generator for synthetic values; pass a seed for reproducible output
+        self._rng = random.Random(seed)
+        
+        # masking level -> field type -> strategy, resolved once
+        self._strategy_table = {
+            level: {
+                field_type: self._resolve_strategy(strategies, idx)
+                for field_type, strategies in self.MASKING_STRATEGIES.items()
+            }
+            for level, idx in self.LEVEL_TO_INDEX.items()
+        }
+        
+        # strategy -> handler(value_str, field_type, current_year)
+        self._strategy_dispatch = {
+            "redact": lambda v, ft, y: "[REDACTED]",
+            "hash": lambda v, ft, y: self._hash_value(v),
+            "partial": lambda v, ft, y: self._partial_mask(v),
+            "synthetic": lambda v, ft, y: self._generate_synthetic(ft),
+            "domain_only": lambda v, ft, y: self._extract_domain(v),
+            "last_four": lambda v, ft, y: self._last_n_chars(v, 4),
+            "initials": lambda v, ft, y: self._to_initials(v),
+            "pseudonym": lambda v, ft, y: self._generate_pseudonym(v),
+            "city_only": lambda v, ft, y: self._extract_city(v),
+            "region_only": lambda v, ft, y: "[Region Hidden]",
+            "year_only": lambda v, ft, y: self._extract_year(v),
+            "age_range": lambda v, ft, y: self._to_age_range(v, y),
+            "subnet": lambda v, ft, y: self._mask_ip(v),
+            "category_only": lambda v, ft, y: "[Category: Medical]",
+            "range": lambda v, ft, y: self._to_range(v)
+        }
     
     def determine_masking_level(self, risk_score: float) -> str:
         """Determine the masking level based on risk score."""
-        for level, thresholds in self.MASKING_LEVELS.items():
-            if thresholds["min_risk"] <= risk_score < thresholds["max_risk"]:
-                return level
-        return "full"
+        # Negative, NaN and >= 1.0 scores fall outside every band and get full masking
+        if not 0.0 <= risk_score < 1.0:
+            return "full"
+        return self.LEVEL_NAMES[bisect.bisect_right(self.LEVEL_BOUNDS, risk_score)]
     
     def get_strategy_for_level(self, field_type: str, masking_level: str) -> str:
         """Get the appropriate masking strategy for a field type and level."""
-        strategies = self.MASKING_STRATEGIES.get(field_type, self.MASKING_STRATEGIES["generic"])
-        
-        level_to_index = {
-            "none": -1,  # No masking
-            "light": 0,
-            "moderate": 1,
-            "heavy": 2,
-            "full": 3
-        }
-        
-        idx = level_to_index.get(masking_level, 3)
+        by_field_type = self._strategy_table.get(masking_level, self._strategy_table["full"])
         
+        # Unknown field types are masked like generic fields
+        return by_field_type.get(field_type) or by_field_type["generic"]
+    
+    @staticmethod
+    def _resolve_strategy(strategies: List[str], idx: int) -> str:
+        """Pick the strategy at a level index, clamped to the strategies available."""
         if idx < 0:
             return "none"
-        
-        # Clamp index to available strategies
-        idx = min(idx, len(strategies) - 1)
-        return strategies[idx]
+        return strategies[min(idx, len(strategies) - 1)]
     
     def mask_data(
         self,
@@ -107,32 +174,36 @@ class AdaptiveMaskingEngine:
             Masked data dictionary
         """
         masking_level = self.determine_masking_level(risk_score)
+        current_year = datetime.now().year
         masked_data = {}
         masking_details = {}
         
+        # Resolve the level's field type -> strategy map once for the whole record
+        strategies = self._strategy_table[masking_level]
+        generic_strategy = strategies["generic"]
+        
         for field, value in data.items():
             field_type = field_types.get(field, "generic")
-            strategy = self.get_strategy_for_level(field_type, masking_level)
+            strategy = strategies.get(field_type, generic_strategy)
             
             if strategy == "none":
                 masked_data[field] = value
                 masking_details[field] = {"strategy": "none", "original_preserved": True}
             else:
-                masked_value = self._apply_masking(value, field_type, strategy)
-                masked_data[field] = masked_value
+                masked_data[field] = self._apply_masking(value, field_type, strategy, current_year)
                 masking_details[field] = {
                     "strategy": strategy,
                     "field_type": field_type,
                     "original_preserved": False
                 }
         
-        # Log the masking operation
+        # Log the masking operation; the details dict is shared with the response, not copied
         self._log_masking(
             requester_id=requester_id,
             purpose=purpose,
             risk_score=risk_score,
             masking_level=masking_level,
-            fields_masked=list(masking_details.keys()),
+            fields_masked=list(masking_details),
             strategies_used=masking_details
         )
         
@@ -146,96 +217,140 @@ class AdaptiveMaskingEngine:
             }
         }
     
-    def _apply_masking(self, value: Any, field_type: str, strategy: str) -> Any:
-        """Apply a specific masking strategy to a value."""
-        if value is None:
-            return None
-        
-        value_str = str(value)
-        
-        # Strategy implementations
-        if strategy == "redact":
-            return "[REDACTED]"
-        
-        elif strategy == "hash":
-            return self._hash_value(value_str)
-        
-        elif strategy == "partial":
-            return self._partial_mask(value_str)
-        
-        elif strategy == "synthetic":
-            return self._generate_synthetic(field_type)
-        
-        elif strategy == "domain_only":
-            return self._extract_domain(value_str)
-        
-        elif strategy == "last_four":
-            return self._last_n_chars(value_str, 4)
-        
-        elif strategy == "initials":
-            return self._to_initials(value_str)
-        
-        elif strategy == "pseudonym":
-            return self._generate_pseudonym(value_str)
-        
-        elif strategy == "city_only":
-            return self._extract_city(value_str)
+    def mask_batch(
+        self,
+        records: List[Dict[str, Any]],
+        field_types: Dict[str, str],
+        risk_score: float,
+        requester_id: str,
+        purpose: str
+    ) -> Dict[str, Any]:
+        """
+        Apply adaptive masking to many records sharing one field schema.
         
-        elif strategy == "region_only":
-            return "[Region Hidden]"
+        The masking level and each field's strategy are resolved once for
+        the whole batch rather than per record, and a single masking log
+        entry is written for the batch.
         
-        elif strategy == "year_only":
-            return self._extract_year(value_str)
+        Args:
+            records: The original data dictionaries
+            field_types: Mapping of field names to their types (email, phone, etc.)
+            risk_score: The calculated risk score (0-1)
+            requester_id: Who is requesting the data
+            purpose: Purpose of the data access
         
-        elif strategy == "age_range":
-            return self._to_age_range(value_str)
+        Returns:
+            Masked records with the masking summary
+        """
+        masking_level = self.determine_masking_level(risk_score)
+        current_year = datetime.now().year
+        strategies = self._strategy_table[masking_level]
+        generic_strategy = strategies["generic"]
+        field_strategies: Dict[str, tuple] = {}
+        masking_details = {}
+        masked_records = []
+        
+        for record in records:
+            masked_data = {}
+            for field, value in record.items():
+                resolved = field_strategies.get(field)
+                if resolved is None:
+                    field_type = field_types.get(field, "generic")
+                    strategy = strategies.get(field_type, generic_strategy)
+                    resolved = field_strategies[field] = (field_type, strategy)
+                    if strategy == "none":
+                        masking_details[field] = {"strategy": "none", "original_preserved": True}
+                    else:
+                        masking_details[field] = {
+                            "strategy": strategy,
+                            "field_type": field_type,
+                            "original_preserved": False
+                        }
+                
+                field_type, strategy = resolved
+                if strategy == "none":
+                    masked_data[field] = value
+                else:
+                    masked_data[field] = self._apply_masking(value, field_type, strategy, current_year)
+            
+            masked_records.append(masked_data)
         
-        elif strategy == "subnet":
-            return self._mask_ip(value_str)
+        self._log_masking(
+            requester_id=requester_id,
+            purpose=purpose,
+            risk_score=risk_score,
+            masking_level=masking_level,
+            fields_masked=list(masking_details),
+            strategies_used=masking_details,
+            records_processed=len(records)
+        )
         
-        elif strategy == "category_only":
-            return "[Category: Medical]"
+        return {
+            "data": masked_records,
+            "masking_applied": {
+                "level": masking_level,
+                "risk_score": risk_score,
+                "records_processed": len(records),
+                "details": masking_details
+            }
+        }
+    
+    def _apply_masking(
+        self,
+        value: Any,
+        field_type: str,
+        strategy: str,
+        current_year: Optional[int] = None
+    ) -> Any:
+        """Apply a specific masking strategy to a value."""
+        if value is None:
+            return None
         
-        elif strategy == "range":
-            return self._to_range(value_str)
+        value_str = str(value)
         
-        return "[MASKED]"
+        handler = self._strategy_dispatch.get(strategy)
+        if handler is None:
+            return "[MASKED]"
+        return handler(value_str, field_type, current_year)
     
-    def _hash_value(self, value: str) -> str:
+    @staticmethod
+    def _hash_value(value: str) -> str:
         """Create a deterministic hash of the value."""
-        hash_obj = hashlib.sha256(value.encode())
-        return f"HASH_{hash_obj.hexdigest()[:12]}"
+        # Hex-encode only the 6 digest bytes kept (same as hexdigest()[:12])
+        return f"HASH_{hashlib.sha256(value.encode()).digest()[:6].hex()}"
     
     def _partial_mask(self, value: str, visible_chars: int = 3) -> str:
         """Partially mask a value, showing only first few characters."""
-        if len(value) <= visible_chars:
-            return "*" * len(value)
-        return value[:visible_chars] + "*" * (len(value) - visible_chars)
+        length = len(value)
+        if length <= visible_chars:
+            return "*" * length
+        # Pad in one allocation instead of slicing, repeating and concatenating
+        return value[:visible_chars].ljust(length, "*")
     
     def _generate_synthetic(self, field_type: str) -> str:
         """Generate synthetic data based on field type."""
         if field_type == "email":
-            name = ''.join(random.choices(string.ascii_lowercase, k=8))
-            domain = random.choice(self.SYNTHETIC_DOMAINS)
+            name = ''.join(self._rng.choices(string.ascii_lowercase, k=8))
+            domain = self._rng.choice(self.SYNTHETIC_DOMAINS)
             return f"{name}@{domain}"
         
         elif field_type == "phone":
-            return f"+1-555-{random.randint(100, 999)}-{random.randint(1000, 9999)}"
+            return f"+1-555-{self._rng.randint(100, 999)}-{self._rng.randint(1000, 9999)}"
         
         elif field_type == "name":
-            return random.choice(self.SYNTHETIC_NAMES)
+            return self._rng.choice(self.SYNTHETIC_NAMES)
         
         elif field_type == "ssn":
-            return f"XXX-XX-{random.randint(1000, 9999)}"
+            return f"XXX-XX-{self._rng.randint(1000, 9999)}"
         
         elif field_type == "address":
-            return f"{random.randint(100, 999)} Synthetic Street, Demo City, ST 00000"
+            return f"{self._rng.randint(100, 999)} Synthetic Street, Demo City, ST 00000"
         
         elif field_type == "dob":
-            return f"{random.randint(1950, 2000)}-01-01"
+            return f"{self._rng.randint(1950, 2000)}-01-01"
         
         elif field_type == "ip_address":
-            return f"10.0.{random.randint(0, 255)}.{random.randint(0, 255)}"
+            return f"10.0.{self._rng.randint(0, 255)}.{self._rng.randint(0, 255)}"
         
         elif field_type == "credit_card":
             return "XXXX-XXXX-XXXX-0000"
@@ -250,18 +365,21 @@ class AdaptiveMaskingEngine:
     
     def _last_n_chars(self, value: str, n: int) -> str:
         """Show only last N characters."""
-        if len(value) <= n:
-            return "*" * len(value)
-        return "*" * (len(value) - n) + value[-n:]
+        length = len(value)
+        if length <= n:
+            return "*" * length
+        return value[-n:].rjust(length, "*")
     
     def _to_initials(self, name: str) -> str:
         """Convert name to initials."""
-        parts = name.split()
-        return ".".join([p[0].upper() for p in parts if p]) + "."
+        # split() never yields empty parts, so no emptiness check is needed
+        return ".".join(p[0] for p in name.split()).upper() + "."
     
-    def _generate_pseudonym(self, value: str) -> str:
+    @staticmethod
+    def _generate_pseudonym(value: str) -> str:
         """Generate a consistent pseudonym."""
-        hash_val = hashlib.md5(value.encode()).hexdigest()[:8]
+        # 8-byte keyed digest: wide enough that distinct values do not collide in practice
+        hash_val = hashlib.blake2b(value.encode(), digest_size=8, key=_PSEUDONYM_KEY).hexdigest()
         return f"User_{hash_val}"
     
     def _extract_city(self, address: str) -> str:
@@ -270,41 +388,37 @@ class AdaptiveMaskingEngine:
     
     def _extract_year(self, date_str: str) -> str:
         """Extract year from date."""
-        match = re.search(r'\d{4}', date_str)
+        match = _YEAR_RE.search(date_str)
         if match:
             return match.group()
         return "[YEAR]"
     
-    def _to_age_range(self, date_str: str) -> str:
+    def _to_age_range(self, date_str: str, current_year: Optional[int] = None) -> str:
         """Convert DOB to age range."""
-        try:
-            year = int(re.search(r'\d{4}', date_str).group())
-            age = datetime.now().year - year
-            
-            if age < 18:
-                return "Under 18"
-            elif age < 30:
-                return "18-29"
-            elif age < 45:
-                return "30-44"
-            elif age < 60:
-                return "45-59"
-            else:
-                return "60+"
-        except:
+        match = _YEAR_RE.search(date_str)
+        if match is None:
             return "[AGE_RANGE]"
+        
+        if current_year is None:
+            current_year = datetime.now().year
+        
+        age = current_year - int(match.group())
+        return _AGE_LABELS[bisect.bisect_right(_AGE_BOUNDS, age)]
     
     def _mask_ip(self, ip: str) -> str:
         """Mask IP address to subnet level."""
-        parts = ip.split(".")
-        if len(parts) == 4:
-            return f"{parts[0]}.{parts[1]}.0.0/16"
-        return "[MASKED_IP]"
+        # inet_pton parses and validates in one C call; unlike inet_aton it
+        # rejects shorthand forms such as "10.1"
+        try:
+            octets = socket.inet_pton(socket.AF_INET, ip)
+        except OSError:
+            return "[MASKED_IP]"
+        return f"{octets[0]}.{octets[1]}.0.0/16"
     
     def _to_range(self, value: str) -> str:
         """Convert numeric value to a range."""
         try:
-            num = float(re.sub(r'[^\d.]', '', value))
+            num = float(_NON_NUMERIC_RE.sub('', value))
             if num < 1000:
                 return "$0-$1,000"
             elif num < 10000:
@@ -318,29 +432,42 @@ class AdaptiveMaskingEngine:
     
     def _log_masking(self, **kwargs):
         """Log masking operation for audit."""
-        self.masking_log.append({
-            "timestamp": datetime.utcnow().isoformat(),
+        # Raw epoch nanoseconds; formatted only when the log is read
+        entry = {
+            "timestamp_ns": time.time_ns(),
             **kwargs
-        })
+        }
         
-        # Keep only last 1000 entries
-        if len(self.masking_log) > 1000:
-            self.masking_log = self.masking_log[-1000:]
+        with self._log_lock:
+            # The deque drops its oldest entry on append once full
+            if len(self.masking_log) == self.MASKING_LOG_SIZE:
+                self._level_counts[self.masking_log[0].get("masking_level", "unknown")] -= 1
+            self.masking_log.append(entry)
+            self._level_counts[entry.get("masking_level", "unknown")] += 1
     
     def get_masking_stats(self) -> Dict[str, Any]:
         """Get masking statistics."""
-        if not self.masking_log:
-            return {"total_operations": 0}
-        
-        levels_count = {}
-        for log in self.masking_log:
-            level = log.get("masking_level", "unknown")
-            levels_count[level] = levels_count.get(level, 0) + 1
-        
+        with self._log_lock:
+            total = len(self.masking_log)
+            if not total:
+                return {"total_operations": 0}
+            
+            return {
+                "total_operations": total,
+                "by_level": {level: count for level, count in self._level_counts.items() if count},
+                "recent_operations": [
+                    self._format_log_entry(self.masking_log[i]) for i in range(-min(10, total), 0)
+                ]
+            }
+    
+    @staticmethod
+    def _format_log_entry(entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Render a log entry with its timestamp as a UTC ISO string."""
+        formatted = dict(entry)
+        timestamp_ns = formatted.pop("timestamp_ns")
         return {
-            "total_operations": len(self.masking_log),
-            "by_level": levels_count,
-            "recent_operations": self.masking_log[-10:]
+            "timestamp": (_EPOCH + timedelta(microseconds=timestamp_ns // 1000)).isoformat(),
+            **formatted
         }
 
 
@@ -1,14 +1,152 @@
 """Audit Logger Service - Logging and retrieval of access decisions."""
 
+import asyncio
+import logging
 from datetime import datetime
-from typing import Dict, Any, List
+from functools import partial
+from typing import Dict, Any, List, Optional
+from sqlalchemy import func, insert, select, tuple_
 from sqlalchemy.orm import Session
+from app.core.database import SessionLocal
 from app.models.audit_log import AuditLog
 
+logger = logging.getLogger(__name__)
+
 
 class AuditLogger:
     """Service for logging and retrieving audit entries."""
     
+    # Maximum rows written per bulk insert
+    FLUSH_BATCH_SIZE = 500
+    
+    # Maximum time (seconds) a queued row waits before being flushed
+    FLUSH_INTERVAL_SECONDS = 0.1
+    
+    # Rows allowed to wait in memory before enqueue falls back to a detached write
+    MAX_QUEUE_SIZE = 10_000
+    
+    def __init__(self):
+        # Pending audit rows, consumed by the background flusher
+        self.queue: Optional[asyncio.Queue] = None
+        self._flusher: Optional[asyncio.Task] = None
+    
+    def start(self):
+        """Start the background flusher (must be called from the event loop)."""
+        self.queue = asyncio.Queue(maxsize=self.MAX_QUEUE_SIZE)
+        self._flusher = asyncio.create_task(self._flush_loop())
+    
+    async def stop(self):
+        """Stop the background flusher after draining all queued rows."""
+        if self._flusher is None:
+            return
+        
+        await self.queue.put(None)
+        await self._flusher
+        self._flusher = None
+        self.queue = None
+    
+    def enqueue_request(
+        self,
+        requester_id: str,
+        requester_role: str,
+        purpose: str,
+        location: str,
+        data_sensitivity: str,
+        decision: str,
+        reason: str,
+        risk_score: float,
+        request_metadata: Dict[str, Any] = None
+    ):
+        """Queue a data access decision for batched insertion."""
+        entry = {
+            "timestamp": datetime.utcnow(),
+            "requester_id": requester_id,
+            "requester_role": requester_role,
+            "purpose": purpose,
+            "location": location,
+            "data_sensitivity": data_sensitivity,
+            "decision": decision,
+            "reason": reason,
+            "risk_score": risk_score,
+            "request_metadata": request_metadata or {}
+        }
+        
+        if self.queue is None:
+            # Flusher not running - write without waiting for it
+            self._write_detached([entry])
+            return
+        
+        try:
+            self.queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            # Flusher is behind; write separately rather than drop the audit row
+            self._write_detached([entry])
+    
+    async def _flush_loop(self):
+        """Collect queued rows and write them in bulk."""
+        loop = asyncio.get_running_loop()
+        stopping = False
+        
+        while not stopping:
+            entry = await self.queue.get()
+            if entry is None:
+                break
+            
+            batch = [entry]
+            deadline = loop.time() + self.FLUSH_INTERVAL_SECONDS
+            
+            while len(batch) < self.FLUSH_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    entry = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if entry is None:
+                    stopping = True
+                    break
+                batch.append(entry)
+            
+            try:
+                await loop.run_in_executor(None, self._write_batch, batch)
+            except Exception:
+                # Keep the flusher alive so later rows are still written
+                logger.exception("Failed to write %d audit log rows", len(batch))
+    
+    def _write_detached(self, batch: List[Dict[str, Any]]):
+        """Write rows outside the queue without blocking a running event loop."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop (e.g. scripts) - a direct write blocks nobody
+            self._write_batch(batch)
+            return
+        
+        future = loop.run_in_executor(None, self._write_batch, batch)
+        future.add_done_callback(partial(self._log_write_failure, len(batch)))
+    
+    @staticmethod
+    def _log_write_failure(count: int, future: asyncio.Future):
+        """Report a detached write that failed, as the flusher does for its batches."""
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(
+                "Failed to write %d audit log rows", count,
+                exc_info=future.exception()
+            )
+    
+    def _write_batch(self, batch: List[Dict[str, Any]]):
+        """Insert a batch of audit rows in a single transaction."""
+        db = SessionLocal()
+        try:
+            db.bulk_insert_mappings(AuditLog, batch)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+    
     def log_request(
         self,
         db: Session,
@@ -23,7 +161,10 @@ class AuditLogger:
         request_metadata: Dict[str, Any] = None
     ) -> AuditLog:
         """Log a data access request and decision."""
-        audit_log = AuditLog(
+        # INSERT ... RETURNING gets the generated id in the same round trip,
+        # instead of a commit followed by a refresh SELECT. The timestamp is
+        # always set here; the column has no database-side default to fall back on
+        stmt = insert(AuditLog.__table__).values(
             timestamp=datetime.utcnow(),
             requester_id=requester_id,
             requester_role=requester_role,
@@ -34,13 +175,12 @@ class AuditLogger:
             reason=reason,
             risk_score=risk_score,
             request_metadata=request_metadata or {}
-        )
+        ).returning(*AuditLog.__table__.columns)
         
-        db.add(audit_log)
+        row = db.execute(stmt).one()
         db.commit()
-        db.refresh(audit_log)
         
-        return audit_log
+        return AuditLog(**row._mapping)
     
     def get_audit_logs(
         self,
@@ -48,21 +188,38 @@ class AuditLogger:
         limit: int = 100,
         offset: int = 0,
         requester_id: str = None,
-        decision: str = None
+        decision: str = None,
+        before: Optional[datetime] = None,
+        before_id: Optional[int] = None
     ) -> List[AuditLog]:
-        """Retrieve audit logs with optional filtering."""
-        query = db.query(AuditLog)
+        """
+        Retrieve audit logs with optional filtering, newest first.
+        
+        Pass the timestamp and id of the last row of the previous page as
+        before/before_id to page by keyset instead of offset, which stays
+        cheap however deep the page is.
+        """
+        # Filters only change the statement's shape, and limit/offset are bound
+        # parameters, so each shape compiles once and is reused from the engine's
+        # compiled-statement cache
+        stmt = select(AuditLog)
         
         if requester_id:
-            query = query.filter(AuditLog.requester_id == requester_id)
+            stmt = stmt.where(AuditLog.requester_id == requester_id)
         
         if decision:
-            query = query.filter(AuditLog.decision == decision)
+            stmt = stmt.where(AuditLog.decision == decision)
         
-        query = query.order_by(AuditLog.timestamp.desc())
-        query = query.offset(offset).limit(limit)
+        if before is not None:
+            if before_id is not None:
+                stmt = stmt.where(tuple_(AuditLog.timestamp, AuditLog.id) < (before, before_id))
+            else:
+                stmt = stmt.where(AuditLog.timestamp < before)
         
-        return query.all()
+        stmt = stmt.order_by(AuditLog.timestamp.desc(), AuditLog.id.desc())
+        stmt = stmt.offset(offset).limit(limit)
+        
+        return db.scalars(stmt).all()
     
     def get_audit_log_by_id(self, db: Session, log_id: int) -> AuditLog:
         """Retrieve a specific audit log by ID."""
@@ -70,9 +227,13 @@ class AuditLogger:
     
     def get_audit_stats(self, db: Session) -> Dict[str, Any]:
         """Get statistics about audit logs."""
-        total_logs = db.query(AuditLog).count()
-        allowed_count = db.query(AuditLog).filter(AuditLog.decision == "ALLOW").count()
-        denied_count = db.query(AuditLog).filter(AuditLog.decision == "DENY").count()
+        # One grouped scan (served by the decision index) instead of three COUNT queries
+        counts = dict(
+            db.query(AuditLog.decision, func.count()).group_by(AuditLog.decision).all()
+        )
+        total_logs = sum(counts.values())
+        allowed_count = counts.get("ALLOW", 0)
+        denied_count = counts.get("DENY", 0)
         
         return {
             "total_requests": total_logs,
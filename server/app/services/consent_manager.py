@@ -1,7 +1,9 @@
 """Consent Manager Service - Simulated user consent storage and validation."""
 
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 from datetime import datetime
+import threading
+from cachetools import TTLCache
 
 
 class ConsentManager:
@@ -28,12 +30,60 @@ class ConsentManager:
                 "data_types": ["profile"]
             }
         }
+        
+        # (requester_id, purpose) -> expires_at for every granted purpose
+        self._consent_index: Dict[Tuple[str, str], Optional[datetime]] = {
+            (requester_id, purpose): consent["expires_at"]
+            for requester_id, consent in self.consents.items()
+            for purpose in consent["purposes"]
+        }
+        
+        # Recent (decision, consent expires_at) pairs keyed on (requester_id, purpose);
+        # cleared on any change
+        self._decision_cache = TTLCache(maxsize=10_000, ttl=60)
+        self._cache_lock = threading.Lock()
     
-    def check_consent(self, request: Dict[str, Any]) -> Dict[str, Any]:
+    def check_consent(self, request: Any) -> Dict[str, Any]:
         """Check whether requested purpose matches granted consent."""
-        requester_id = request.get("requester_id")
-        purpose = request.get("purpose")
+        key = (request.requester_id, request.purpose)
+        
+        with self._cache_lock:
+            cached = self._decision_cache.get(key)
+        
+        # A grant cached before its consent expired must not outlive it
+        if cached is not None:
+            result, expires_at = cached
+            if expires_at is None or datetime.utcnow() <= expires_at:
+                return self._copy_result(result)
+        
+        result = self._evaluate_consent(*key)
+        expires_at = self._consent_index.get(key) if result["has_consent"] else None
+        with self._cache_lock:
+            self._decision_cache[key] = (result, expires_at)
+        
+        return self._copy_result(result)
+    
+    @staticmethod
+    def _copy_result(result: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy a cached decision so callers never share the cache entry."""
+        return {**result, "granted_purposes": list(result["granted_purposes"])}
+    
+    def _evaluate_consent(self, requester_id: str, purpose: str) -> Dict[str, Any]:
+        """Evaluate consent for a requester and purpose."""
+        key = (requester_id, purpose)
+        if key in self._consent_index:
+            expires_at = self._consent_index[key]
+            consent = self.consents.get(requester_id)
+            # A record revoked mid-lookup counts as no consent
+            if consent and (expires_at is None or datetime.utcnow() <= expires_at):
+                return {
+                    "has_consent": True,
+                    "reason": f"Consent granted for purpose: {purpose}",
+                    "granted_purposes": consent.get("purposes", []),
+                    "granted_at": consent.get("granted_at").isoformat() if consent.get("granted_at") else None
+                }
         
+        # Denied: fall back to the full record to explain why
         consent = self.consents.get(requester_id)
         
         if not consent:
@@ -52,18 +102,10 @@ class ConsentManager:
         
         granted_purposes = consent.get("purposes", [])
         
-        if purpose not in granted_purposes:
-            return {
-                "has_consent": False,
-                "reason": f"Purpose '{purpose}' not in granted consents. Granted: {', '.join(granted_purposes)}",
-                "granted_purposes": granted_purposes
-            }
-        
         return {
-            "has_consent": True,
-            "reason": f"Consent granted for purpose: {purpose}",
-            "granted_purposes": granted_purposes,
-            "granted_at": consent.get("granted_at").isoformat() if consent.get("granted_at") else None
+            "has_consent": False,
+            "reason": f"Purpose '{purpose}' not in granted consents. Granted: {', '.join(granted_purposes)}",
+            "granted_purposes": granted_purposes
         }
     
     def _is_consent_expired(self, consent: Dict[str, Any]) -> bool:
@@ -75,20 +117,38 @@ class ConsentManager:
     
     def grant_consent(self, requester_id: str, purposes: list, data_types: list = None) -> bool:
         """Grant consent for a requester."""
+        self._drop_index_entries(requester_id)
+        # Store the record before indexing it, so an index hit always finds it
         self.consents[requester_id] = {
             "purposes": purposes,
             "granted_at": datetime.utcnow(),
             "expires_at": None,
             "data_types": data_types or []
         }
+        self._consent_index.update(((requester_id, purpose), None) for purpose in purposes)
+        self._invalidate_cache()
         return True
     
     def revoke_consent(self, requester_id: str) -> bool:
         """Revoke consent for a requester."""
         if requester_id in self.consents:
+            self._drop_index_entries(requester_id)
             del self.consents[requester_id]
+            self._invalidate_cache()
             return True
         return False
+    
+    def _drop_index_entries(self, requester_id: str):
+        """Remove a requester's existing purposes from the consent index."""
+        consent = self.consents.get(requester_id)
+        if consent:
+            for purpose in consent["purposes"]:
+                self._consent_index.pop((requester_id, purpose), None)
+    
+    def _invalidate_cache(self):
+        """Drop cached consent decisions after a consent change."""
+        with self._cache_lock:
+            self._decision_cache.clear()
 
 
 consent_manager = ConsentManager()
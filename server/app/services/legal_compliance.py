@@ -5,9 +5,35 @@ Automatically applies the strictest global privacy laws based on geography,
 ensuring compliance with GDPR, CCPA, DPDP (India), LGPD (Brazil), and more.
 """
 
-from datetime import datetime
-from typing import Dict, Any, List, Optional
+from collections import Counter, deque
+from datetime import datetime, timedelta
+from itertools import chain, combinations, islice
+from typing import Deque, Dict, Any, FrozenSet, List, Mapping, NamedTuple, Optional, Sequence, Tuple
 from enum import Enum
+from types import MappingProxyType
+import threading
+import time
+from app.core.config import get_settings
+
+settings = get_settings()
+
+# Naive UTC epoch used to render timestamps
+_EPOCH = datetime(1970, 1, 1)
+
+# Requirements merged by OR across jurisdictions (True is stricter)
+_BOOLEAN_REQUIREMENTS = (
+    "consent_required", "explicit_consent_for_sensitive",
+    "right_to_erasure", "data_portability", "dpo_required",
+    "cross_border_restrictions", "profiling_opt_out",
+    "automated_decision_rights", "data_minimization",
+    "retention_limits"
+)
+
+# Purposes accepted without a warning under strict purpose limitation
+_STRICT_LIMITATION_PURPOSES = frozenset({"analytics", "research", "compliance", "audit", "operational"})
+
+# Ordering of purpose_limitation values, least to most strict
+_PURPOSE_STRICTNESS = {"none": 0, "moderate": 1, "strict": 2}
 
 
 class Jurisdiction(str, Enum):
@@ -24,6 +50,42 @@ class Jurisdiction(str, Enum):
     GLOBAL = "GLOBAL"   # Most restrictive combination
 
 
+# Plain-string values by member; a dict lookup is about twice as fast as Enum.value
+_JURISDICTION_VALUES = {j: j.value for j in Jurisdiction}
+
+
+class ComplianceLogEntry(NamedTuple):
+    """
+    One compliance check in the in-memory log.
+    
+    A flat tuple costs far less memory than the nested report dicts, which
+    are only built for the entries a report actually returns.
+    """
+    timestamp: str
+    requester_id: Optional[str]
+    purpose: Optional[str]
+    sensitivity: Optional[str]
+    is_compliant: bool
+    applicable_laws: Tuple[str, ...]
+    issues_count: int
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Render the entry in the report's nested format."""
+        return {
+            "timestamp": self.timestamp,
+            "request_summary": {
+                "requester_id": self.requester_id,
+                "purpose": self.purpose,
+                "sensitivity": self.sensitivity
+            },
+            "result_summary": {
+                "is_compliant": self.is_compliant,
+                "applicable_laws": self.applicable_laws,
+                "issues_count": self.issues_count
+            }
+        }
+
+
 class LegalComplianceEngine:
     """
     Smart compliance engine that:
@@ -32,8 +94,18 @@ class LegalComplianceEngine:
     3. Enforces jurisdiction-specific requirements automatically
     """
     
-    # Comprehensive privacy law definitions
-    PRIVACY_LAWS = {
+    __slots__ = (
+        "compliance_log",
+        "_log_lock",
+        "log_enabled",
+        "_laws_summary",
+        "_iso_cache",
+        "_strictness_cache"
+    )
+    
+    # Comprehensive privacy law definitions; read-only, since the strictness
+    # table and law summary are precomputed from it
+    PRIVACY_LAWS = MappingProxyType({
         Jurisdiction.EU: {
             "name": "GDPR",
             "full_name": "General Data Protection Regulation",
@@ -184,11 +256,12 @@ class LegalComplianceEngine:
                 "max_fine_amount": 1_000_000  # SGD
             }
         }
-    }
+    })
     
     # Geographic mapping to jurisdictions
     GEO_MAPPING = {
         # EU Countries
+        "EU": Jurisdiction.EU,
         "DE": Jurisdiction.EU, "FR": Jurisdiction.EU, "IT": Jurisdiction.EU,
         "ES": Jurisdiction.EU, "NL": Jurisdiction.EU, "BE": Jurisdiction.EU,
         "PL": Jurisdiction.EU, "SE": Jurisdiction.EU, "AT": Jurisdiction.EU,
@@ -208,8 +281,39 @@ class LegalComplianceEngine:
         "AU": Jurisdiction.AUSTRALIA,
     }
     
+    # Laws applied when no specific jurisdiction is detected (most restrictive combination)
+    GLOBAL_JURISDICTIONS = (Jurisdiction.EU, Jurisdiction.INDIA)
+    
+    # Number of compliance checks kept in the in-memory log
+    COMPLIANCE_LOG_SIZE = 1000
+    
     def __init__(self):
-        self.compliance_log: List[Dict] = []
+        # Bounded: the deque drops the oldest check on append once full
+        self.compliance_log: Deque[ComplianceLogEntry] = deque(maxlen=self.COMPLIANCE_LOG_SIZE)
+        self._log_lock = threading.Lock()
+        self.log_enabled: bool = settings.compliance_log_enabled
+        
+        # PRIVACY_LAWS never changes, so its summary is built once
+        self._laws_summary: List[Dict[str, Any]] = [
+            {
+                "jurisdiction": j.value,
+                "name": law["name"],
+                "full_name": law["full_name"],
+                "region": law["region"],
+                "strictness_score": law["strictness_score"]
+            }
+            for j, law in self.PRIVACY_LAWS.items()
+        ]
+        
+        # (epoch milliseconds, ISO string) of the last timestamp formatted
+        self._iso_cache = (-1, "")
+        
+        # PRIVACY_LAWS is static, so the merge for every subset of laws is done once here
+        self._strictness_cache: Dict[FrozenSet[Jurisdiction], Mapping[str, Any]] = {
+            frozenset(laws): self._merge_requirements(laws)
+            for size in range(len(self.PRIVACY_LAWS) + 1)
+            for laws in combinations(self.PRIVACY_LAWS, size)
+        }
     
     def detect_jurisdictions(
         self,
@@ -217,7 +321,7 @@ class LegalComplianceEngine:
         requester_location: str,
         data_storage_location: str,
         company_hq_location: str = None
-    ) -> List[Jurisdiction]:
+    ) -> Tuple[Jurisdiction, ...]:
         """
         Detect all applicable jurisdictions based on data flow.
         
@@ -228,35 +332,61 @@ class LegalComplianceEngine:
         
         Similar rules apply for other jurisdictions.
         """
+        geo_mapping = self.GEO_MAPPING
+        
+        # Common case: subject, requester and storage share one location
+        if data_subject_location == requester_location == data_storage_location:
+            jurisdiction = geo_mapping.get(data_subject_location.upper()) if data_subject_location else None
+            return (jurisdiction if jurisdiction is not None else Jurisdiction.GLOBAL,)
+        
         jurisdictions = set()
         
         # Map locations to jurisdictions
-        for location in [data_subject_location, requester_location, data_storage_location]:
+        for location in (data_subject_location, requester_location, data_storage_location):
             if location:
-                loc_upper = location.upper()
-                if loc_upper in self.GEO_MAPPING:
-                    jurisdictions.add(self.GEO_MAPPING[loc_upper])
-                elif loc_upper == "EU":
-                    jurisdictions.add(Jurisdiction.EU)
+                jurisdiction = geo_mapping.get(location.upper())
+                if jurisdiction is not None:
+                    jurisdictions.add(jurisdiction)
         
         # If no specific jurisdiction found, apply GLOBAL (most restrictive)
         if not jurisdictions:
-            jurisdictions.add(Jurisdiction.GLOBAL)
+            return (Jurisdiction.GLOBAL,)
         
-        return list(jurisdictions)
+        return tuple(jurisdictions)
     
     def get_strictest_requirements(
         self,
-        jurisdictions: List[Jurisdiction]
+        jurisdictions: Sequence[Jurisdiction]
     ) -> Dict[str, Any]:
         """
         Merge requirements from all applicable jurisdictions,
         always choosing the strictest option.
+        
+        The merged requirements come from a read-only table precomputed in
+        __init__; each call returns its own copy.
         """
         if Jurisdiction.GLOBAL in jurisdictions or not jurisdictions:
             # Apply most restrictive combination
-            jurisdictions = [Jurisdiction.EU, Jurisdiction.INDIA]
+            jurisdictions = self.GLOBAL_JURISDICTIONS
+        
+        requirements = self._lookup_requirements(jurisdictions)
+        return {
+            **requirements,
+            "merged_requirements": dict(requirements["merged_requirements"]),
+            "jurisdictions": [_JURISDICTION_VALUES[j] for j in jurisdictions]
+        }
+    
+    def _lookup_requirements(self, jurisdictions) -> Mapping[str, Any]:
+        """Fetch the precomputed, read-only merge for the jurisdictions' privacy laws."""
+        if Jurisdiction.GLOBAL in jurisdictions or not jurisdictions:
+            jurisdictions = self.GLOBAL_JURISDICTIONS
         
+        # Jurisdictions without a law definition contribute no requirements
+        laws = frozenset(j for j in jurisdictions if j in self.PRIVACY_LAWS)
+        return self._strictness_cache[laws]
+    
+    def _merge_requirements(self, jurisdictions) -> Mapping[str, Any]:
+        """Merge the requirements of the given jurisdictions, strictest option first."""
         merged = {
             "consent_required": False,
             "explicit_consent_for_sensitive": False,
@@ -284,11 +414,7 @@ class LegalComplianceEngine:
                 reqs = law["requirements"]
                 
                 # Apply strictest boolean requirements (True is stricter)
-                for key in ["consent_required", "explicit_consent_for_sensitive",
-                           "right_to_erasure", "data_portability", "dpo_required",
-                           "cross_border_restrictions", "profiling_opt_out",
-                           "automated_decision_rights", "data_minimization",
-                           "retention_limits"]:
+                for key in _BOOLEAN_REQUIREMENTS:
                     if reqs.get(key, False):
                         merged[key] = True
                 
@@ -303,18 +429,17 @@ class LegalComplianceEngine:
                         )
                 
                 # For purpose limitation, take strictest
-                purpose_strictness = {"none": 0, "moderate": 1, "strict": 2}
-                current = purpose_strictness.get(merged["purpose_limitation"], 0)
-                new = purpose_strictness.get(reqs.get("purpose_limitation", "none"), 0)
+                current = _PURPOSE_STRICTNESS.get(merged["purpose_limitation"], 0)
+                new = _PURPOSE_STRICTNESS.get(reqs.get("purpose_limitation", "none"), 0)
                 if new > current:
                     merged["purpose_limitation"] = reqs["purpose_limitation"]
         
-        return {
-            "merged_requirements": merged,
-            "applicable_laws": applicable_laws,
-            "strictness_score": max_strictness,
-            "jurisdictions": [j.value for j in jurisdictions]
-        }
+        # Read-only: the merge is precomputed once and shared by every lookup
+        return MappingProxyType({
+            "merged_requirements": MappingProxyType(merged),
+            "applicable_laws": tuple(applicable_laws),
+            "strictness_score": max_strictness
+        })
     
     def evaluate_compliance(
         self,
@@ -334,8 +459,81 @@ class LegalComplianceEngine:
             data_storage_location=request.get("data_storage_location", "US")
         )
         
-        # Get strictest requirements
-        requirements = self.get_strictest_requirements(jurisdictions)
+        result = self._check_requirements(
+            request,
+            data_subject_location,
+            requester_location,
+            jurisdictions,
+            self._utc_iso_now()
+        )
+        
+        # Log compliance check
+        self._log_compliance_check(request, result)
+        
+        return result
+    
+    def evaluate_compliance_batch(
+        self,
+        checks: List[Tuple[Dict[str, Any], str, str]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Evaluate many data access requests in one call, e.g. to audit past access.
+        
+        Jurisdictions are detected once per distinct location triple, every
+        result shares one evaluation timestamp, and the log is appended
+        under a single lock acquisition.
+        
+        Args:
+            checks: (request, data_subject_location, requester_location) tuples,
+                with the same arguments as evaluate_compliance
+            
+        Returns:
+            One evaluate_compliance result per check, in order
+        """
+        evaluated_at = self._utc_iso_now()
+        jurisdictions_by_locations: Dict[tuple, Tuple[Jurisdiction, ...]] = {}
+        results = []
+        
+        for request, data_subject_location, requester_location in checks:
+            locations = (
+                data_subject_location,
+                requester_location,
+                request.get("data_storage_location", "US")
+            )
+            jurisdictions = jurisdictions_by_locations.get(locations)
+            if jurisdictions is None:
+                jurisdictions = jurisdictions_by_locations[locations] = self.detect_jurisdictions(*locations)
+            
+            results.append(self._check_requirements(
+                request,
+                data_subject_location,
+                requester_location,
+                jurisdictions,
+                evaluated_at
+            ))
+        
+        if self.log_enabled:
+            entries = [
+                self._build_log_entry(request, result)
+                for (request, _, _), result in zip(checks, results)
+            ]
+            with self._log_lock:
+                self.compliance_log.extend(entries)
+        
+        return results
+    
+    def _check_requirements(
+        self,
+        request: Dict[str, Any],
+        data_subject_location: str,
+        requester_location: str,
+        jurisdictions: Sequence[Jurisdiction],
+        evaluated_at: str
+    ) -> Dict[str, Any]:
+        """Run the compliance checks for already-detected jurisdictions."""
+        # Get strictest requirements straight from the precomputed table; the
+        # result already carries its own jurisdiction list
+        requirements = self._lookup_requirements(jurisdictions)
         merged_reqs = requirements["merged_requirements"]
         
         compliance_issues = []
@@ -355,7 +553,7 @@ class LegalComplianceEngine:
         # Check purpose limitation
         if merged_reqs["purpose_limitation"] == "strict":
             purpose = request.get("purpose", "")
-            if purpose not in ["analytics", "research", "compliance", "audit", "operational"]:
+            if purpose not in _STRICT_LIMITATION_PURPOSES:
                 compliance_issues.append({
                     "issue": "PURPOSE_LIMITATION",
                     "severity": "warning",
@@ -378,80 +576,84 @@ class LegalComplianceEngine:
                 })
                 required_actions.append("Verify Standard Contractual Clauses or adequacy decision")
         
-        # Determine overall compliance
-        blocking_issues = [i for i in compliance_issues if i.get("severity") == "blocking"]
-        is_compliant = len(blocking_issues) == 0
+        # Decided from every issue raised, so a new blocking check is counted automatically
+        is_compliant = not any(i["severity"] == "blocking" for i in compliance_issues)
         
-        result = {
+        return {
             "is_compliant": is_compliant,
-            "jurisdictions": [j.value for j in jurisdictions],
+            "jurisdictions": [_JURISDICTION_VALUES[j] for j in jurisdictions],
             "applicable_laws": requirements["applicable_laws"],
             "strictness_score": requirements["strictness_score"],
-            "requirements_applied": merged_reqs,
+            "requirements_applied": dict(merged_reqs),
             "compliance_issues": compliance_issues,
             "required_actions": required_actions,
-            "evaluated_at": datetime.utcnow().isoformat()
+            "evaluated_at": evaluated_at
         }
-        
-        # Log compliance check
-        self._log_compliance_check(request, result)
-        
-        return result
+    
+    def _utc_iso_now(self) -> str:
+        """Current UTC time as an ISO string, formatted at most once per millisecond."""
+        now_ms = time.time_ns() // 1_000_000
+        cached_ms, cached_iso = self._iso_cache
+        if now_ms != cached_ms:
+            cached_iso = (_EPOCH + timedelta(milliseconds=now_ms)).isoformat()
+            # Single tuple assignment, so concurrent readers never see a torn pair
+            self._iso_cache = (now_ms, cached_iso)
+        return cached_iso
     
     def get_law_details(self, jurisdiction: Jurisdiction) -> Optional[Dict[str, Any]]:
         """Get detailed information about a specific privacy law."""
         return self.PRIVACY_LAWS.get(jurisdiction)
     
     def get_all_laws_summary(self) -> List[Dict[str, Any]]:
-        """Get summary of all supported privacy laws."""
-        return [
-            {
-                "jurisdiction": j.value,
-                "name": law["name"],
-                "full_name": law["full_name"],
-                "region": law["region"],
-                "strictness_score": law["strictness_score"]
-            }
-            for j, law in self.PRIVACY_LAWS.items()
-        ]
+        """Get summary of all supported privacy laws (built once; treat as read-only)."""
+        return self._laws_summary
     
     def _log_compliance_check(self, request: Dict, result: Dict):
         """Log compliance check for audit."""
-        self.compliance_log.append({
-            "timestamp": datetime.utcnow().isoformat(),
-            "request_summary": {
-                "requester_id": request.get("requester_id"),
-                "purpose": request.get("purpose"),
-                "sensitivity": request.get("data_sensitivity")
-            },
-            "result_summary": {
-                "is_compliant": result["is_compliant"],
-                "applicable_laws": result["applicable_laws"],
-                "issues_count": len(result["compliance_issues"])
-            }
-        })
+        if not self.log_enabled:
+            return
+        
+        entry = self._build_log_entry(request, result)
         
-        # Keep only last 1000 entries
-        if len(self.compliance_log) > 1000:
-            self.compliance_log = self.compliance_log[-1000:]
+        with self._log_lock:
+            self.compliance_log.append(entry)
+    
+    def _build_log_entry(self, request: Dict, result: Dict) -> ComplianceLogEntry:
+        """Summarize a compliance check for the log."""
+        return ComplianceLogEntry(
+            timestamp=result["evaluated_at"],
+            requester_id=request.get("requester_id"),
+            purpose=request.get("purpose"),
+            sensitivity=request.get("data_sensitivity"),
+            is_compliant=result["is_compliant"],
+            applicable_laws=result["applicable_laws"],
+            issues_count=len(result["compliance_issues"])
+        )
+    
+    def enable_logging(self, enabled: bool = True):
+        """Turn the in-memory compliance log on or off; existing entries are kept."""
+        self.log_enabled = enabled
     
     def get_compliance_report(self, limit: int = 50) -> Dict[str, Any]:
         """Generate compliance report."""
-        recent = self.compliance_log[-limit:]
+        with self._log_lock:
+            # A limit of 0 keeps the old slice behaviour of reporting the whole log
+            start = max(0, len(self.compliance_log) - limit) if limit else 0
+            recent = list(islice(self.compliance_log, start, None))
         
-        compliant_count = sum(1 for r in recent if r["result_summary"]["is_compliant"])
+        compliant_count = sum(1 for entry in recent if entry.is_compliant)
         
-        laws_applied = {}
-        for r in recent:
-            for law in r["result_summary"]["applicable_laws"]:
-                laws_applied[law] = laws_applied.get(law, 0) + 1
+        # Counter tallies the flattened law names in C
+        laws_applied = dict(Counter(chain.from_iterable(
+            entry.applicable_laws for entry in recent
+        )))
         
         return {
             "total_checks": len(recent),
             "compliant_requests": compliant_count,
             "compliance_rate": round(compliant_count / len(recent) * 100, 2) if recent else 0,
             "laws_applied": laws_applied,
-            "recent_checks": recent[-10:]
+            "recent_checks": [entry.to_dict() for entry in recent[-10:]]
         }
 
 
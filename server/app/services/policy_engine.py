@@ -3,10 +3,30 @@
 from typing import Dict, Any
 
 
+# Policy checks in evaluation order
+_CHECK_NAMES = ("role_valid", "purpose_allowed", "jurisdiction_allowed", "sensitivity_allowed")
+
+# Check flags once the first n checks have passed; results carry a copy
+_CHECKS_AFTER = tuple(
+    {name: i < passed for i, name in enumerate(_CHECK_NAMES)}
+    for passed in range(len(_CHECK_NAMES) + 1)
+)
+
+_ALLOWED_RESULT = {
+    "allowed": True,
+    "reason": "All policy checks passed",
+    "checks": _CHECKS_AFTER[len(_CHECK_NAMES)]
+}
+
+
 class PolicyEngine:
     """Rule-based policy enforcement engine."""
     
-    VALID_PURPOSES = [
+    # Stateless: all policy data lives on the class
+    __slots__ = ()
+    
+    # Frozensets: every check below is a hashed membership test, not a list scan
+    VALID_PURPOSES = frozenset({
         "analytics",
         "research",
         "compliance",
@@ -15,16 +35,16 @@ class PolicyEngine:
         "operational",
         "marketing",
         "security"
-    ]
+    })
     
-    VALID_JURISDICTIONS = [
+    VALID_JURISDICTIONS = frozenset({
         "US",
         "EU",
         "UK",
         "APAC",
         "LATAM",
         "GLOBAL"
-    ]
+    })
     
     ROLE_PERMISSIONS = {
         "admin": {
@@ -33,13 +53,13 @@ class PolicyEngine:
             "max_sensitivity": "high"
         },
         "analyst": {
-            "purposes": ["analytics", "research", "reporting"],
-            "jurisdictions": ["US", "EU", "UK"],
+            "purposes": frozenset({"analytics", "research", "reporting"}),
+            "jurisdictions": frozenset({"US", "EU", "UK"}),
             "max_sensitivity": "medium"
         },
         "external": {
-            "purposes": ["reporting"],
-            "jurisdictions": ["US"],
+            "purposes": frozenset({"reporting"}),
+            "jurisdictions": frozenset({"US"}),
             "max_sensitivity": "low"
         }
     }
@@ -50,83 +70,57 @@ class PolicyEngine:
         "high": 3
     }
     
-    def evaluate_policy(self, request: Dict[str, Any]) -> Dict[str, Any]:
-        """Evaluate access policy for a given request."""
-        requester_role = request.get("role")
-        purpose = request.get("purpose")
-        location = request.get("location")
-        data_sensitivity = request.get("data_sensitivity")
-        
-        checks = {
-            "role_valid": False,
-            "purpose_allowed": False,
-            "jurisdiction_allowed": False,
-            "sensitivity_allowed": False
-        }
+    # Store each role's ceiling as a level too, so the check below is a single int compare
+    for _perms in ROLE_PERMISSIONS.values():
+        _perms["max_sensitivity_level"] = SENSITIVITY_LEVELS[_perms["max_sensitivity"]]
+    del _perms
+    
+    def evaluate_policy(self, request: Any) -> Dict[str, Any]:
+        """
+        Evaluate access policy for a request exposing role, purpose, location and data_sensitivity.
         
-        if requester_role not in self.ROLE_PERMISSIONS:
-            return {
-                "allowed": False,
-                "reason": f"Invalid role: {requester_role}",
-                "checks": checks
-            }
+        Each call returns a fresh result the caller may modify.
+        """
+        requester_role = request.role
+        purpose = request.purpose
+        location = request.location
+        data_sensitivity = request.data_sensitivity
         
-        checks["role_valid"] = True
-        role_perms = self.ROLE_PERMISSIONS[requester_role]
+        role_perms = self.ROLE_PERMISSIONS.get(requester_role)
+        if role_perms is None:
+            return self._deny(f"Invalid role: {requester_role}", 0)
         
         if purpose not in self.VALID_PURPOSES:
-            return {
-                "allowed": False,
-                "reason": f"Invalid purpose: {purpose}",
-                "checks": checks
-            }
+            return self._deny(f"Invalid purpose: {purpose}", 1)
         
         if purpose not in role_perms["purposes"]:
-            return {
-                "allowed": False,
-                "reason": f"Purpose '{purpose}' not allowed for role '{requester_role}'",
-                "checks": checks
-            }
-        
-        checks["purpose_allowed"] = True
+            return self._deny(f"Purpose '{purpose}' not allowed for role '{requester_role}'", 1)
         
         if location not in self.VALID_JURISDICTIONS:
-            return {
-                "allowed": False,
-                "reason": f"Invalid jurisdiction: {location}",
-                "checks": checks
-            }
+            return self._deny(f"Invalid jurisdiction: {location}", 2)
         
         if location not in role_perms["jurisdictions"]:
-            return {
-                "allowed": False,
-                "reason": f"Access from jurisdiction '{location}' not allowed for role '{requester_role}'",
-                "checks": checks
-            }
+            return self._deny(f"Access from jurisdiction '{location}' not allowed for role '{requester_role}'", 2)
         
-        checks["jurisdiction_allowed"] = True
+        sensitivity_level = self.SENSITIVITY_LEVELS.get(data_sensitivity)
+        if sensitivity_level is None:
+            return self._deny(f"Invalid sensitivity level: {data_sensitivity}", 3)
         
-        if data_sensitivity not in self.SENSITIVITY_LEVELS:
-            return {
-                "allowed": False,
-                "reason": f"Invalid sensitivity level: {data_sensitivity}",
-                "checks": checks
-            }
-        
-        max_allowed_sensitivity = role_perms["max_sensitivity"]
-        if self.SENSITIVITY_LEVELS[data_sensitivity] > self.SENSITIVITY_LEVELS[max_allowed_sensitivity]:
-            return {
-                "allowed": False,
-                "reason": f"Data sensitivity '{data_sensitivity}' exceeds maximum allowed '{max_allowed_sensitivity}' for role '{requester_role}'",
-                "checks": checks
-            }
-        
-        checks["sensitivity_allowed"] = True
+        if sensitivity_level > role_perms["max_sensitivity_level"]:
+            return self._deny(
+                f"Data sensitivity '{data_sensitivity}' exceeds maximum allowed '{role_perms['max_sensitivity']}' for role '{requester_role}'",
+                3
+            )
         
+        return {**_ALLOWED_RESULT, "checks": dict(_ALLOWED_RESULT["checks"])}
+    
+    @staticmethod
+    def _deny(reason: str, checks_passed: int) -> Dict[str, Any]:
+        """Build a denial after the first checks_passed checks succeeded."""
         return {
-            "allowed": True,
-            "reason": "All policy checks passed",
-            "checks": checks
+            "allowed": False,
+            "reason": reason,
+            "checks": dict(_CHECKS_AFTER[checks_passed])
         }
 
 
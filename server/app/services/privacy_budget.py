@@ -7,10 +7,50 @@ privacy principles.
 """
 
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, List
-from collections import defaultdict
+from typing import Deque, Dict, Any, Optional, List, Tuple
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from functools import lru_cache, partial
+from itertools import islice
+import heapq
 import math
 import hashlib
+import threading
+import time
+
+
+# Times are kept as epoch seconds and only formatted as ISO strings in responses
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _to_iso(ts: float) -> str:
+    """Format epoch seconds as a naive UTC ISO string."""
+    return (_EPOCH + timedelta(seconds=ts)).isoformat()
+
+
+# Alert level indexed by how many thresholds (30%, 10% remaining) a budget is below;
+# None leaves the current level as it is
+_ALERT_LEVELS = (None, "warning", "critical")
+
+
+@lru_cache(maxsize=4096)
+def _record_scale_factor(num_records: int) -> float:
+    """Logarithmic cost multiplier for a query over num_records records."""
+    # Record counts repeat (page sizes, fixed batches), so most calls are cache hits
+    return 1 + (math.log(num_records) / 10)
+
+
+@dataclass(slots=True)
+class _Budget:
+    """One subject's budget window; dicts are only built for API responses."""
+    
+    total_budget: float
+    remaining_budget: float
+    window_start: float
+    queries_count: int = 0
+    last_query: Optional[float] = None
+    alert_level: str = "normal"
+    custom_reset_hours: Optional[int] = None
 
 
 class PrivacyBudgetManager:
@@ -27,6 +67,10 @@ class PrivacyBudgetManager:
     
     # Budget reset window (24 hours by default)
     BUDGET_RESET_HOURS = 24
+    BUDGET_RESET_SECONDS = BUDGET_RESET_HOURS * 3600
+    
+    # Queries kept in each subject's history
+    QUERY_HISTORY_SIZE = 1000
     
     # Query costs based on sensitivity and aggregation level
     QUERY_EPSILON_COSTS = {
@@ -49,37 +93,47 @@ class PrivacyBudgetManager:
     
     def __init__(self):
         # Privacy budget tracking per data subject
-        # Structure: {subject_id: {budget_info}}
-        self.budgets: Dict[str, Dict[str, Any]] = {}
+        self.budgets: Dict[str, _Budget] = {}
         
-        # Query history for audit
-        self.query_history: Dict[str, List[Dict]] = defaultdict(list)
+        # Query history for audit; each deque drops its oldest query once full
+        self.query_history: Dict[str, Deque[Dict]] = defaultdict(
+            partial(deque, maxlen=self.QUERY_HISTORY_SIZE)
+        )
         
         # Blocked requesters (temporary ban for budget abuse)
-        self.blocked_requesters: Dict[str, datetime] = {}
+        self.blocked_requesters: Dict[str, float] = {}
+        
+        # (block_until, requester_id) min-heap, so expired blocks are dropped
+        # even for requesters who never query again
+        self._block_heap: List[Tuple[float, str]] = []
+        
+        # Guards all of the above; engine checks call in from threadpool threads
+        self._lock = threading.Lock()
     
-    def _get_or_create_budget(self, subject_id: str) -> Dict[str, Any]:
-        """Get or initialize budget for a data subject."""
-        if subject_id not in self.budgets:
-            self.budgets[subject_id] = {
-                "total_budget": self.DEFAULT_EPSILON_BUDGET,
-                "remaining_budget": self.DEFAULT_EPSILON_BUDGET,
-                "window_start": datetime.utcnow(),
-                "queries_count": 0,
-                "last_query": None,
-                "alert_level": "normal"
-            }
+    def _get_or_create_budget(self, subject_id: str, now: Optional[float] = None) -> _Budget:
+        """Get or initialize budget for a data subject as of now (epoch seconds, defaults to the current time); caller holds the lock."""
+        if now is None:
+            now = time.time()
+        
+        budget = self.budgets.get(subject_id)
+        if budget is None:
+            # A brand-new window cannot need a reset
+            budget = self.budgets[subject_id] = _Budget(
+                total_budget=self.DEFAULT_EPSILON_BUDGET,
+                remaining_budget=self.DEFAULT_EPSILON_BUDGET,
+                window_start=now
+            )
+            return budget
         
         # Check if budget should reset
-        budget = self.budgets[subject_id]
-        window_end = budget["window_start"] + timedelta(hours=self.BUDGET_RESET_HOURS)
+        window_end = budget.window_start + self.BUDGET_RESET_SECONDS
         
-        if datetime.utcnow() > window_end:
+        if now > window_end:
             # Reset budget for new window
-            budget["remaining_budget"] = budget["total_budget"]
-            budget["window_start"] = datetime.utcnow()
-            budget["queries_count"] = 0
-            budget["alert_level"] = "normal"
+            budget.remaining_budget = budget.total_budget
+            budget.window_start = now
+            budget.queries_count = 0
+            budget.alert_level = "normal"
         
         return budget
     
@@ -106,8 +160,7 @@ class PrivacyBudgetManager:
         
         # Scale cost logarithmically with number of records
         if num_records > 1:
-            scale_factor = 1 + (math.log(num_records) / 10)
-            return base_cost * scale_factor
+            return base_cost * _record_scale_factor(num_records)
         
         return base_cost
     
@@ -134,77 +187,79 @@ class PrivacyBudgetManager:
         Returns:
             Decision with remaining budget info
         """
-        # Check if requester is blocked
-        if requester_id in self.blocked_requesters:
-            block_until = self.blocked_requesters[requester_id]
-            if datetime.utcnow() < block_until:
+        # Check-then-consume must be atomic, or concurrent queries could both
+        # pass the remaining-budget test and overspend it
+        with self._lock:
+            # One clock read serves every timestamp of this query
+            now = time.time()
+            
+            self._expire_blocks(now)
+            
+            # Check if requester is blocked; expired blocks were just dropped
+            block_until = self.blocked_requesters.get(requester_id)
+            if block_until is not None:
                 return {
                     "allowed": False,
                     "reason": "Requester temporarily blocked for privacy budget abuse",
-                    "blocked_until": block_until.isoformat(),
+                    "blocked_until": _to_iso(block_until),
                     "budget_remaining": 0
                 }
-            else:
-                del self.blocked_requesters[requester_id]
-        
-        budget = self._get_or_create_budget(subject_id)
-        query_cost = self.calculate_query_cost(query_type, data_sensitivity, num_records)
-        
-        # Check if enough budget remains
-        if budget["remaining_budget"] < query_cost:
-            # Set alert level
-            budget["alert_level"] = "exhausted"
             
-            # Log the blocked query
+            budget = self._get_or_create_budget(subject_id, now)
+            query_cost = self.calculate_query_cost(query_type, data_sensitivity, num_records)
+            
+            # Check if enough budget remains
+            if budget.remaining_budget < query_cost:
+                # Set alert level
+                budget.alert_level = "exhausted"
+                
+                # Log the blocked query
+                self._log_query(
+                    subject_id, requester_id, query_cost, 
+                    False, "Budget exhausted", purpose, now
+                )
+                
+                # Calculate when budget resets
+                reset_time = budget.window_start + self.BUDGET_RESET_SECONDS
+                
+                return {
+                    "allowed": False,
+                    "reason": f"Privacy budget exhausted for subject {subject_id}. " +
+                             f"Required: {query_cost:.4f}ε, Available: {budget.remaining_budget:.4f}ε",
+                    "budget_remaining": budget.remaining_budget,
+                    "budget_resets_at": _to_iso(reset_time),
+                    "query_cost": query_cost,
+                    "alert_level": "exhausted"
+                }
+            
+            # Consume budget
+            budget.remaining_budget -= query_cost
+            budget.queries_count += 1
+            budget.last_query = now
+            
+            # Set alert levels
+            budget_percentage = budget.remaining_budget / budget.total_budget
+            alert_level = _ALERT_LEVELS[(budget_percentage < 0.3) + (budget_percentage < 0.1)]
+            if alert_level is not None:
+                budget.alert_level = alert_level
+            
+            # Log successful query
             self._log_query(
-                subject_id, requester_id, query_cost, 
-                False, "Budget exhausted", purpose
+                subject_id, requester_id, query_cost,
+                True, "Budget consumed", purpose, now
             )
             
-            # Calculate when budget resets
-            reset_time = budget["window_start"] + timedelta(hours=self.BUDGET_RESET_HOURS)
-            
             return {
-                "allowed": False,
-                "reason": f"Privacy budget exhausted for subject {subject_id}. " +
-                         f"Required: {query_cost:.4f}ε, Available: {budget['remaining_budget']:.4f}ε",
-                "budget_remaining": budget["remaining_budget"],
-                "budget_resets_at": reset_time.isoformat(),
+                "allowed": True,
+                "reason": f"Query allowed. Budget consumed: {query_cost:.4f}ε",
+                "budget_remaining": budget.remaining_budget,
+                "budget_total": budget.total_budget,
+                "budget_percentage": round(budget_percentage * 100, 2),
                 "query_cost": query_cost,
-                "alert_level": "exhausted"
+                "queries_count": budget.queries_count,
+                "alert_level": budget.alert_level,
+                "window_resets_at": _to_iso(budget.window_start + self.BUDGET_RESET_SECONDS)
             }
-        
-        # Consume budget
-        budget["remaining_budget"] -= query_cost
-        budget["queries_count"] += 1
-        budget["last_query"] = datetime.utcnow()
-        
-        # Set alert levels
-        budget_percentage = budget["remaining_budget"] / budget["total_budget"]
-        if budget_percentage < 0.1:
-            budget["alert_level"] = "critical"
-        elif budget_percentage < 0.3:
-            budget["alert_level"] = "warning"
-        
-        # Log successful query
-        self._log_query(
-            subject_id, requester_id, query_cost,
-            True, "Budget consumed", purpose
-        )
-        
-        return {
-            "allowed": True,
-            "reason": f"Query allowed. Budget consumed: {query_cost:.4f}ε",
-            "budget_remaining": budget["remaining_budget"],
-            "budget_total": budget["total_budget"],
-            "budget_percentage": round(budget_percentage * 100, 2),
-            "query_cost": query_cost,
-            "queries_count": budget["queries_count"],
-            "alert_level": budget["alert_level"],
-            "window_resets_at": (
-                budget["window_start"] + timedelta(hours=self.BUDGET_RESET_HOURS)
-            ).isoformat()
-        }
     
     def _log_query(
         self,
@@ -213,39 +268,41 @@ class PrivacyBudgetManager:
         cost: float,
         allowed: bool,
         reason: str,
-        purpose: str
+        purpose: str,
+        now: float
     ):
-        """Log query for audit purposes."""
+        """Log query for audit purposes; the timestamp is formatted when history is read."""
         self.query_history[subject_id].append({
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": now,
             "requester_id": requester_id,
             "cost": cost,
             "allowed": allowed,
             "reason": reason,
             "purpose": purpose
         })
-        
-        # Keep only last 1000 queries per subject
-        if len(self.query_history[subject_id]) > 1000:
-            self.query_history[subject_id] = self.query_history[subject_id][-1000:]
     
     def get_budget_status(self, subject_id: str) -> Dict[str, Any]:
         """Get current budget status for a subject."""
+        with self._lock:
+            return self._budget_status(subject_id)
+    
+    def _budget_status(self, subject_id: str) -> Dict[str, Any]:
+        """Build a subject's budget status; caller holds the lock."""
         budget = self._get_or_create_budget(subject_id)
-        reset_time = budget["window_start"] + timedelta(hours=self.BUDGET_RESET_HOURS)
+        reset_time = budget.window_start + self.BUDGET_RESET_SECONDS
         
         return {
             "subject_id": subject_id,
-            "total_budget": budget["total_budget"],
-            "remaining_budget": round(budget["remaining_budget"], 4),
+            "total_budget": budget.total_budget,
+            "remaining_budget": round(budget.remaining_budget, 4),
             "budget_percentage": round(
-                (budget["remaining_budget"] / budget["total_budget"]) * 100, 2
+                (budget.remaining_budget / budget.total_budget) * 100, 2
             ),
-            "queries_count": budget["queries_count"],
-            "window_start": budget["window_start"].isoformat(),
-            "window_resets_at": reset_time.isoformat(),
-            "alert_level": budget["alert_level"],
-            "last_query": budget["last_query"].isoformat() if budget["last_query"] else None
+            "queries_count": budget.queries_count,
+            "window_start": _to_iso(budget.window_start),
+            "window_resets_at": _to_iso(reset_time),
+            "alert_level": budget.alert_level,
+            "last_query": _to_iso(budget.last_query) if budget.last_query else None
         }
     
     def set_custom_budget(
@@ -255,15 +312,14 @@ class PrivacyBudgetManager:
         reset_hours: int = 24
     ) -> Dict[str, Any]:
         """Set a custom privacy budget for a subject (admin function)."""
-        self.budgets[subject_id] = {
-            "total_budget": epsilon_budget,
-            "remaining_budget": epsilon_budget,
-            "window_start": datetime.utcnow(),
-            "queries_count": 0,
-            "last_query": None,
-            "alert_level": "normal",
-            "custom_reset_hours": reset_hours
-        }
+        budget = _Budget(
+            total_budget=epsilon_budget,
+            remaining_budget=epsilon_budget,
+            window_start=time.time(),
+            custom_reset_hours=reset_hours
+        )
+        with self._lock:
+            self.budgets[subject_id] = budget
         
         return {
             "subject_id": subject_id,
@@ -278,19 +334,43 @@ class PrivacyBudgetManager:
         limit: int = 50
     ) -> List[Dict[str, Any]]:
         """Get query history for a subject."""
-        history = self.query_history.get(subject_id, [])
-        return history[-limit:]
+        with self._lock:
+            history = self.query_history.get(subject_id)
+            if not history:
+                return []
+            
+            # A limit of 0 keeps the old slice behaviour of returning everything
+            start = max(0, len(history) - limit) if limit else 0
+            entries = list(islice(history, start, None))
+        
+        return [
+            {**entry, "timestamp": _to_iso(entry["timestamp"])}
+            for entry in entries
+        ]
     
     def block_requester(self, requester_id: str, hours: int = 1):
         """Temporarily block a requester for privacy abuse."""
-        self.blocked_requesters[requester_id] = datetime.utcnow() + timedelta(hours=hours)
+        block_until = time.time() + hours * 3600
+        with self._lock:
+            self.blocked_requesters[requester_id] = block_until
+            heapq.heappush(self._block_heap, (block_until, requester_id))
+    
+    def _expire_blocks(self, now: float):
+        """Drop every block that has ended by now; caller holds the lock."""
+        heap = self._block_heap
+        while heap and heap[0][0] <= now:
+            block_until, requester_id = heapq.heappop(heap)
+            # A later re-block leaves this entry stale; keep the newer block
+            if self.blocked_requesters.get(requester_id) == block_until:
+                del self.blocked_requesters[requester_id]
     
     def get_all_budgets_summary(self) -> List[Dict[str, Any]]:
         """Get summary of all privacy budgets (admin function)."""
-        return [
-            self.get_budget_status(subject_id)
-            for subject_id in self.budgets.keys()
-        ]
+        with self._lock:
+            return [
+                self._budget_status(subject_id)
+                for subject_id in list(self.budgets)
+            ]
 
 
 # Singleton instance
@@ -1,6 +1,7 @@
 """Risk Engine Service - Risk assessment and scoring for data access requests."""
 
-from typing import Dict, Any
+from itertools import product
+from typing import Dict, Any, Iterable, List, Tuple
 from app.core.config import get_settings
 
 settings = get_settings()
@@ -41,18 +42,84 @@ class RiskEngine:
         "GLOBAL": 0.6
     }
     
-    def assess_risk(self, request: Dict[str, Any]) -> Dict[str, Any]:
-        """Assess risk level for a given request."""
-        role = request.get("role")
-        purpose = request.get("purpose")
-        location = request.get("location")
-        data_sensitivity = request.get("data_sensitivity")
+    # Weight of each factor in the overall risk score
+    RISK_FACTOR_WEIGHTS = {
+        "role": 0.25,
+        "sensitivity": 0.35,
+        "purpose": 0.25,
+        "jurisdiction": 0.15
+    }
+    
+    def __init__(self):
+        # Every known (role, sensitivity, purpose, location) combination scored
+        # up front; unknown values fall back to computing with the 0.5 default
+        self._assessment_table: Dict[Tuple[str, str, str, str], Tuple] = {
+            (role, sensitivity, purpose, location): self._score_factors(
+                role_score, sensitivity_score, purpose_score, jurisdiction_score
+            )
+            for (role, role_score), (sensitivity, sensitivity_score), (purpose, purpose_score), (location, jurisdiction_score)
+            in product(
+                self.ROLE_RISK_WEIGHTS.items(),
+                self.SENSITIVITY_RISK_WEIGHTS.items(),
+                self.PURPOSE_RISK_WEIGHTS.items(),
+                self.JURISDICTION_RISK_WEIGHTS.items()
+            )
+        }
+    
+    def assess_risk(self, request: Any) -> Dict[str, Any]:
+        """Assess risk level for a request exposing role, purpose, location and data_sensitivity."""
+        scored = self._assessment_table.get(
+            (request.role, request.data_sensitivity, request.purpose, request.location)
+        )
+        if scored is None:
+            scored = self._score_request(request)
+        
+        return self._package_assessment(scored, settings.risk_threshold)
+    
+    def assess_risk_batch(self, requests: Iterable[Any]) -> List[Dict[str, Any]]:
+        """
+        Assess risk for many requests, e.g. when replaying audit logs.
         
-        role_score = self.ROLE_RISK_WEIGHTS.get(role, 0.5)
-        sensitivity_score = self.SENSITIVITY_RISK_WEIGHTS.get(data_sensitivity, 0.5)
-        purpose_score = self.PURPOSE_RISK_WEIGHTS.get(purpose, 0.5)
-        jurisdiction_score = self.JURISDICTION_RISK_WEIGHTS.get(location, 0.5)
+        The score table and threshold are bound once for the whole batch
+        instead of being looked up again for every request.
         
+        Args:
+            requests: Objects exposing role, purpose, location and data_sensitivity
+            
+        Returns:
+            One assess_risk result per request, in order
+        """
+        lookup = self._assessment_table.get
+        score_request = self._score_request
+        package_assessment = self._package_assessment
+        threshold = settings.risk_threshold
+        
+        results = []
+        for request in requests:
+            scored = lookup((request.role, request.data_sensitivity, request.purpose, request.location))
+            if scored is None:
+                scored = score_request(request)
+            results.append(package_assessment(scored, threshold))
+        
+        return results
+    
+    def _score_request(self, request: Any) -> Tuple:
+        """Score a request whose values are not all in the precomputed table."""
+        return self._score_factors(
+            self.ROLE_RISK_WEIGHTS.get(request.role, 0.5),
+            self.SENSITIVITY_RISK_WEIGHTS.get(request.data_sensitivity, 0.5),
+            self.PURPOSE_RISK_WEIGHTS.get(request.purpose, 0.5),
+            self.JURISDICTION_RISK_WEIGHTS.get(request.location, 0.5)
+        )
+    
+    def _score_factors(
+        self,
+        role_score: float,
+        sensitivity_score: float,
+        purpose_score: float,
+        jurisdiction_score: float
+    ) -> Tuple:
+        """Return (risk_score, risk_level, role, sensitivity, purpose, jurisdiction risks)."""
         risk_score = self.calculate_risk_score(
             role_score,
             sensitivity_score,
@@ -60,6 +127,20 @@ class RiskEngine:
             jurisdiction_score
         )
         
+        return (
+            risk_score,
+            self.get_risk_level(risk_score),
+            role_score,
+            sensitivity_score,
+            purpose_score,
+            jurisdiction_score
+        )
+    
+    @staticmethod
+    def _package_assessment(scored: Tuple, threshold: float) -> Dict[str, Any]:
+        """Build the assessment dict from a scored tuple."""
+        risk_score, risk_level, role_score, sensitivity_score, purpose_score, jurisdiction_score = scored
+        
         risk_factors = {
             "role_risk": role_score,
             "sensitivity_risk": sensitivity_score,
@@ -67,15 +148,12 @@ class RiskEngine:
             "jurisdiction_risk": jurisdiction_score
         }
         
-        risk_level = self.get_risk_level(risk_score)
-        exceeds_threshold = risk_score > settings.risk_threshold
-        
         return {
             "risk_score": round(risk_score, 3),
             "risk_level": risk_level,
-            "exceeds_threshold": exceeds_threshold,
+            "exceeds_threshold": risk_score > threshold,
             "risk_factors": risk_factors,
-            "threshold": settings.risk_threshold
+            "threshold": threshold
         }
     
     def calculate_risk_score(
@@ -86,12 +164,7 @@ class RiskEngine:
         jurisdiction_score: float
     ) -> float:
         """Calculate weighted risk score."""
-        weights = {
-            "role": 0.25,
-            "sensitivity": 0.35,
-            "purpose": 0.25,
-            "jurisdiction": 0.15
-        }
+        weights = self.RISK_FACTOR_WEIGHTS
         
         total_score = (
             role_score * weights["role"] +
@@ -6,10 +6,15 @@ when a user withdraws consent. Compliant with GDPR Article 17.
 """
 
 from datetime import datetime
-from typing import Dict, Any, List, Optional, Callable
+from typing import Dict, Any, FrozenSet, List, Optional, Callable, Tuple
 from enum import Enum
+from functools import lru_cache
+from itertools import chain
 import hashlib
 import asyncio
+import inspect
+import time
+import orjson
 
 
 class PurgeStatus(str, Enum):
@@ -31,6 +36,18 @@ class DataLayer(str, Enum):
     THIRD_PARTY = "third_party_services"
 
 
+# Bit flag per layer result status; anything else (e.g. still running) maps to _PENDING_BIT
+_COMPLETED_BIT = 1
+_SKIPPED_BIT = 2
+_FAILED_BIT = 4
+_PENDING_BIT = 8
+_LAYER_STATUS_BITS = {
+    "completed": _COMPLETED_BIT,
+    "skipped": _SKIPPED_BIT,
+    "failed": _FAILED_BIT
+}
+
+
 class RTBFTriggerService:
     """
     Right to Be Forgotten (RTBF) service for automated data purging.
@@ -42,6 +59,9 @@ class RTBFTriggerService:
     4. Notifies all downstream systems
     """
     
+    # Seconds a running purge absorbs identical repeat triggers (same subject and scope)
+    INFLIGHT_DEDUP_SECONDS = 60
+    
     def __init__(self):
         # Track active RTBF requests
         self.active_requests: Dict[str, Dict[str, Any]] = {}
@@ -49,9 +69,16 @@ class RTBFTriggerService:
         # Completed purge records (for compliance audit)
         self.purge_records: List[Dict[str, Any]] = []
         
+        # Completed records by request ID, and their certificates by subject hash
+        self._record_by_request_id: Dict[str, Dict[str, Any]] = {}
+        self._cert_by_subject_hash: Dict[str, Dict[str, Any]] = {}
+        
         # Blocked subjects (immediate access block on RTBF trigger)
         self.blocked_subjects: Dict[str, datetime] = {}
         
+        # Purges still running, by (subject, scope): (monotonic start time, request_id)
+        self._inflight: Dict[Tuple[str, FrozenSet[str]], Tuple[float, str]] = {}
+        
         # Registered data layer handlers
         self.layer_handlers: Dict[DataLayer, Callable] = {}
         
@@ -71,7 +98,7 @@ class RTBFTriggerService:
             DataLayer.THIRD_PARTY: self._notify_third_parties
         }
     
-    def trigger_rtbf(
+    async def trigger_rtbf(
         self,
         subject_id: str,
         requested_by: str,
@@ -90,12 +117,23 @@ class RTBFTriggerService:
             verification_token: Optional verification for sensitive operations
             
         Returns:
-            RTBF request details and status
+            RTBF request details and status; a repeat trigger for the same
+            subject and scope while that purge is still running returns the
+            in-flight request
         """
-        request_id = self._generate_request_id(subject_id)
+        # A narrower or wider scope is a different purge and must run itself
+        inflight_key = (subject_id, frozenset(scope or ["all"]))
+        inflight = self._inflight.get(inflight_key)
+        if inflight is not None:
+            started_at, inflight_id = inflight
+            if time.monotonic() - started_at < self.INFLIGHT_DEDUP_SECONDS and inflight_id in self.active_requests:
+                return self.active_requests[inflight_id]
+        
+        now = datetime.utcnow()
+        request_id = self._generate_request_id(subject_id, now)
         
         # Immediately block all access to this subject's data
-        self.blocked_subjects[subject_id] = datetime.utcnow()
+        self.blocked_subjects[subject_id] = now
         
         # Create RTBF request record
         rtbf_request = {
@@ -105,73 +143,100 @@ class RTBFTriggerService:
             "reason": reason,
             "scope": scope or ["all"],
             "status": PurgeStatus.PENDING,
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow(),
+            "created_at": now,
+            "updated_at": now,
             "layer_status": {},
             "access_blocked": True,
             "verification": verification_token is not None
         }
         
         self.active_requests[request_id] = rtbf_request
+        self._inflight[inflight_key] = (time.monotonic(), request_id)
         
         # Execute purge across all layers
-        purge_results = self._execute_purge(request_id, subject_id, scope)
+        try:
+            purge_results = await self._execute_purge(request_id, subject_id, scope)
+        finally:
+            # Cleared whatever the outcome, so a failed purge can be retried
+            self._inflight.pop(inflight_key, None)
         
         # Update request with results
         rtbf_request["layer_status"] = purge_results
         rtbf_request["status"] = self._determine_overall_status(purge_results)
-        rtbf_request["updated_at"] = datetime.utcnow()
+        completed_at = rtbf_request["updated_at"] = datetime.utcnow()
         
         # If completed, generate deletion certificate
         if rtbf_request["status"] == PurgeStatus.COMPLETED:
-            rtbf_request["deletion_certificate"] = self._generate_deletion_certificate(
-                request_id, subject_id, purge_results
+            certificate = self._generate_deletion_certificate(
+                request_id, subject_id, purge_results, completed_at
             )
+            rtbf_request["deletion_certificate"] = certificate
             
             # Move to completed records
             self.purge_records.append(rtbf_request)
+            self._record_by_request_id[request_id] = rtbf_request
+            # setdefault keeps the first certificate, as the old scan returned
+            self._cert_by_subject_hash.setdefault(certificate["subject_id_hash"], certificate)
             del self.active_requests[request_id]
         
         return rtbf_request
     
-    def _execute_purge(
+    async def _execute_purge(
         self,
         request_id: str,
         subject_id: str,
         scope: List[str]
     ) -> Dict[str, Dict[str, Any]]:
-        """Execute purge across all data layers."""
+        """Execute purge across all data layers concurrently."""
         results = {}
+        in_scope = []
         
         for layer, handler in self.layer_handlers.items():
-            try:
-                # Check if this layer is in scope
-                if scope and "all" not in scope:
-                    if layer.value not in scope:
-                        results[layer.value] = {
-                            "status": "skipped",
-                            "reason": "Not in scope"
-                        }
-                        continue
-                
-                # Execute layer-specific purge
-                result = handler(subject_id, request_id)
+            # Check if this layer is in scope
+            if scope and "all" not in scope and layer.value not in scope:
                 results[layer.value] = {
-                    "status": "completed",
-                    "records_affected": result.get("records_affected", 0),
-                    "timestamp": datetime.utcnow().isoformat(),
-                    "details": result.get("details", {})
+                    "status": "skipped",
+                    "reason": "Not in scope"
                 }
-            except Exception as e:
+            else:
+                # Placeholder keeps results in layer order
+                results[layer.value] = None
+                in_scope.append(layer)
+        
+        # Layers are independent, so total latency is the slowest layer rather than the sum
+        outcomes = await asyncio.gather(
+            *(self._run_layer_purge(self.layer_handlers[layer], subject_id, request_id) for layer in in_scope),
+            return_exceptions=True
+        )
+        
+        for layer, outcome in zip(in_scope, outcomes):
+            if isinstance(outcome, Exception):
                 results[layer.value] = {
                     "status": "failed",
-                    "error": str(e),
+                    "error": str(outcome),
                     "timestamp": datetime.utcnow().isoformat()
                 }
+            else:
+                results[layer.value] = outcome
         
         return results
     
-    def _purge_primary_db(self, subject_id: str, request_id: str) -> Dict:
+    @staticmethod
+    async def _run_layer_purge(handler: Callable, subject_id: str, request_id: str) -> Dict[str, Any]:
+        """Run one layer's purge handler and record when it completed."""
+        if inspect.iscoroutinefunction(handler):
+            result = await handler(subject_id, request_id)
+        else:
+            # Plain handlers may block, so they run off the event loop
+            result = await asyncio.to_thread(handler, subject_id, request_id)
+        return {
+            "status": "completed",
+            "records_affected": result.get("records_affected", 0),
+            "timestamp": datetime.utcnow().isoformat(),
+            "details": result.get("details", {})
+        }
+    
+    async def _purge_primary_db(self, subject_id: str, request_id: str) -> Dict:
         """Purge from primary database."""
         # In production, this would execute actual DB deletions
         return {
@@ -182,7 +247,7 @@ class RTBFTriggerService:
             }
         }
     
-    def _purge_cache(self, subject_id: str, request_id: str) -> Dict:
+    async def _purge_cache(self, subject_id: str, request_id: str) -> Dict:
         """Purge from cache layers (Redis, Memcached, etc.)."""
         return {
             "records_affected": 3,
@@ -195,7 +260,7 @@ class RTBFTriggerService:
             }
         }
     
-    def _purge_search_index(self, subject_id: str, request_id: str) -> Dict:
+    async def _purge_search_index(self, subject_id: str, request_id: str) -> Dict:
         """Remove from search indices (Elasticsearch, etc.)."""
         return {
             "records_affected": 1,
@@ -204,7 +269,7 @@ class RTBFTriggerService:
             }
         }
     
-    def _purge_ml_models(self, subject_id: str, request_id: str) -> Dict:
+    async def _purge_ml_models(self, subject_id: str, request_id: str) -> Dict:
         """
         Handle ML model data removal.
         Note: May require model retraining for complete removal.
@@ -218,7 +283,7 @@ class RTBFTriggerService:
             }
         }
     
-    def _purge_analytics(self, subject_id: str, request_id: str) -> Dict:
+    async def _purge_analytics(self, subject_id: str, request_id: str) -> Dict:
         """Remove from analytics/data warehouse."""
         return {
             "records_affected": 50,
@@ -228,7 +293,7 @@ class RTBFTriggerService:
             }
         }
     
-    def _purge_audit_logs(self, subject_id: str, request_id: str) -> Dict:
+    async def _purge_audit_logs(self, subject_id: str, request_id: str) -> Dict:
         """
         Handle audit log entries.
         Note: Some jurisdictions require audit log retention - we anonymize instead.
@@ -242,7 +307,7 @@ class RTBFTriggerService:
             }
         }
     
-    def _schedule_backup_purge(self, subject_id: str, request_id: str) -> Dict:
+    async def _schedule_backup_purge(self, subject_id: str, request_id: str) -> Dict:
         """
         Schedule backup purge.
         Backups are purged according to retention policy.
@@ -259,7 +324,7 @@ class RTBFTriggerService:
             }
         }
     
-    def _notify_third_parties(self, subject_id: str, request_id: str) -> Dict:
+    async def _notify_third_parties(self, subject_id: str, request_id: str) -> Dict:
         """Notify third-party processors of RTBF request."""
         return {
             "records_affected": 0,
@@ -275,40 +340,57 @@ class RTBFTriggerService:
     
     def _determine_overall_status(self, results: Dict) -> PurgeStatus:
         """Determine overall RTBF status from layer results."""
-        statuses = [r.get("status") for r in results.values()]
+        # One pass collecting which statuses occur, instead of an all() and two any() scans
+        flags = 0
+        for r in results.values():
+            flags |= _LAYER_STATUS_BITS.get(r.get("status"), _PENDING_BIT)
         
-        if all(s in ["completed", "skipped"] for s in statuses):
+        if not flags & (_FAILED_BIT | _PENDING_BIT):
             return PurgeStatus.COMPLETED
-        elif any(s == "failed" for s in statuses):
-            if any(s == "completed" for s in statuses):
+        elif flags & _FAILED_BIT:
+            if flags & _COMPLETED_BIT:
                 return PurgeStatus.PARTIAL
             return PurgeStatus.FAILED
         return PurgeStatus.IN_PROGRESS
     
-    def _generate_request_id(self, subject_id: str) -> str:
+    def _generate_request_id(self, subject_id: str, now: datetime) -> str:
         """Generate unique request ID."""
-        timestamp = datetime.utcnow().isoformat()
+        timestamp = now.isoformat()
         data = f"{subject_id}:{timestamp}"
-        return f"RTBF_{hashlib.sha256(data.encode()).hexdigest()[:16]}"
+        # Hex-encode only the 8 bytes kept rather than the full digest
+        return f"RTBF_{hashlib.sha256(data.encode()).digest()[:8].hex()}"
+    
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _hash_subject(subject_id: str) -> str:
+        """Hash a subject ID for certificates (the same subject is hashed on issue and lookup)."""
+        return hashlib.sha256(subject_id.encode()).hexdigest()
     
     def _generate_deletion_certificate(
         self,
         request_id: str,
         subject_id: str,
-        results: Dict
+        results: Dict,
+        deleted_at: datetime
     ) -> Dict[str, Any]:
         """Generate cryptographic deletion certificate."""
         cert_data = {
             "request_id": request_id,
-            "subject_id_hash": hashlib.sha256(subject_id.encode()).hexdigest(),
-            "deletion_timestamp": datetime.utcnow().isoformat(),
+            "subject_id_hash": self._hash_subject(subject_id),
+            "deletion_timestamp": deleted_at.isoformat(),
             "layers_purged": list(results.keys()),
             "compliance_standards": ["GDPR_Art17", "CCPA", "DPDP"]
         }
         
-        # Create certificate hash for verification
-        cert_string = str(sorted(cert_data.items()))
-        cert_data["certificate_hash"] = hashlib.sha256(cert_string.encode()).hexdigest()
+        # Certificate hash for verification: each field in key order as
+        # key NUL compact-JSON(value) SOH, streamed into the hasher
+        hasher = hashlib.sha256()
+        for key in sorted(cert_data):
+            hasher.update(key.encode())
+            hasher.update(b"\x00")
+            hasher.update(orjson.dumps(cert_data[key]))
+            hasher.update(b"\x01")
+        cert_data["certificate_hash"] = hasher.hexdigest()
         
         return cert_data
     
@@ -318,34 +400,26 @@ class RTBFTriggerService:
     
     def get_request_status(self, request_id: str) -> Optional[Dict[str, Any]]:
         """Get status of an RTBF request."""
-        if request_id in self.active_requests:
-            return self.active_requests[request_id]
+        record = self.active_requests.get(request_id)
+        if record is not None:
+            return record
         
-        for record in self.purge_records:
-            if record["request_id"] == request_id:
-                return record
-        
-        return None
+        return self._record_by_request_id.get(request_id)
     
     def get_deletion_certificate(self, subject_id: str) -> Optional[Dict[str, Any]]:
         """Retrieve deletion certificate for a subject."""
-        subject_hash = hashlib.sha256(subject_id.encode()).hexdigest()
-        
-        for record in self.purge_records:
-            cert = record.get("deletion_certificate", {})
-            if cert.get("subject_id_hash") == subject_hash:
-                return cert
-        
-        return None
+        return self._cert_by_subject_hash.get(self._hash_subject(subject_id))
     
     def get_all_rtbf_requests(self, status: PurgeStatus = None) -> List[Dict]:
         """Get all RTBF requests, optionally filtered by status."""
-        all_requests = list(self.active_requests.values()) + self.purge_records
+        # Snapshot the active requests first: trigger_rtbf adds and removes them on
+        # the event loop while this runs in the threadpool
+        all_requests = chain(list(self.active_requests.values()), self.purge_records)
         
         if status:
             return [r for r in all_requests if r.get("status") == status]
         
-        return all_requests
+        return list(all_requests)
 
 
 # Singleton instance
@@ -5,15 +5,60 @@ These tokens are designed for AI/ML pipeline access where data should only be
 accessible for the duration of a single task execution.
 """
 
+from collections import deque
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
-from jose import JWTError, jwt
+from typing import Deque, Dict, Any, Iterable, List, Optional, Tuple
+import asyncio
+import heapq
+import logging
+import jwt
 import secrets
 import hashlib
+import threading
+import time
+from cachetools import TTLCache
 from app.core.config import get_settings
+from app.core.security import encode_token
 
 settings = get_settings()
 
+# Token settings bound once; they never change while the process runs
+_SECRET = settings.secret_key
+_ALGORITHMS = [settings.algorithm]
+
+# Token times are kept as epoch seconds and only formatted as ISO strings in responses
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _to_iso(ts: float) -> str:
+    """Format epoch seconds as a naive UTC ISO string."""
+    return (_EPOCH + timedelta(seconds=ts)).isoformat()
+
+
+# Rejection templates for validate_and_consume; callers get a copy of each
+_REVOKED_RESULT = {
+    "valid": False,
+    "reason": "Token has been destroyed (revoked)",
+    "destroyed": True
+}
+_NOT_FOUND_RESULT = {
+    "valid": False,
+    "reason": "Token not found or already destroyed",
+    "destroyed": True
+}
+_EXPIRED_RESULT = {
+    "valid": False,
+    "reason": "Token self-destructed (TTL expired)",
+    "destroyed": True
+}
+_MAX_USES_RESULT = {
+    "valid": False,
+    "reason": "Token self-destructed (max uses reached)",
+    "destroyed": True
+}
+
+logger = logging.getLogger(__name__)
+
 
 class SelfDestructingTokenManager:
     """
@@ -23,12 +68,80 @@ class SelfDestructingTokenManager:
     3. Maximum TTL (time-to-live)
     """
     
+    # Seconds between background sweeps for TTL-expired tokens
+    SWEEP_INTERVAL_SECONDS = 30
+    
+    # Destroyed token records kept for audit
+    DESTROYED_LOG_SIZE = 1000
+    
+    # Most recent uses kept in each token's access log
+    ACCESS_LOG_SIZE = 32
+    
     def __init__(self):
         # In-memory store for active tokens (use Redis in production)
         self.active_tokens: Dict[str, Dict[str, Any]] = {}
         # Revoked tokens (blacklist)
         self.revoked_tokens: set = set()
         
+        # (expires_ts, token_id) min-heap of revocations; once a token's own exp
+        # has passed its JWT no longer verifies, so the revocation can be dropped
+        self._revocation_heap: List[Tuple[float, str]] = []
+        
+        # Active token_ids per user and per task in issue order (dicts as
+        # ordered sets), kept in step with active_tokens
+        self._tokens_by_user: Dict[str, Dict[str, None]] = {}
+        self._tokens_by_task: Dict[str, Dict[str, None]] = {}
+        
+        # Decoded payloads by sha256(token), so replayed tokens skip signature
+        # verification; entries are never used past the token's own exp
+        self._verified: TTLCache = TTLCache(maxsize=10_000, ttl=600)
+        self._verified_lock = threading.Lock()
+        
+        # Most recently destroyed tokens' metadata, oldest dropped first
+        self.destroyed_tokens: Deque[Dict[str, Any]] = deque(maxlen=self.DESTROYED_LOG_SIZE)
+        
+        self._sweeper: Optional[asyncio.Task] = None
+    
+    def start_sweeper(self):
+        """Start the background TTL sweeper (must be called from the event loop)."""
+        self._sweeper = asyncio.create_task(self._sweep_loop())
+    
+    async def stop_sweeper(self):
+        """Stop the background TTL sweeper."""
+        if self._sweeper is None:
+            return
+        
+        self._sweeper.cancel()
+        try:
+            await self._sweeper
+        except asyncio.CancelledError:
+            pass
+        self._sweeper = None
+    
+    async def _sweep_loop(self):
+        """Periodically destroy tokens whose TTL has passed."""
+        while True:
+            await asyncio.sleep(self.SWEEP_INTERVAL_SECONDS)
+            try:
+                self.sweep_expired_tokens()
+            except Exception:
+                # Keep sweeping; a failed pass is retried on the next interval
+                logger.exception("Token TTL sweep failed")
+    
+    def sweep_expired_tokens(self) -> int:
+        """Destroy every active token past its TTL and return how many were destroyed."""
+        now = time.time()
+        expired = [
+            token_id
+            for token_id, token_data in list(self.active_tokens.items())
+            if now > token_data["expires_ts"]
+        ]
+        
+        self._destroy_tokens(expired, "TTL sweep")
+        self._expire_revocations(now)
+        
+        return len(expired)
+    
     def generate_task_token(
         self,
         user_id: str,
@@ -52,9 +165,10 @@ class SelfDestructingTokenManager:
         Returns:
             Token details including the JWT and metadata
         """
-        token_id = secrets.token_urlsafe(32)
-        issued_at = datetime.utcnow()
-        expires_at = issued_at + timedelta(seconds=max_ttl_seconds)
+        # 128 random bits, 22 urlsafe characters
+        token_id = secrets.token_urlsafe(16)
+        issued_ts = time.time()
+        expires_ts = issued_ts + max_ttl_seconds
         
         # Create JWT payload
         payload = {
@@ -63,34 +177,36 @@ class SelfDestructingTokenManager:
             "task_id": task_id,
             "task_type": task_type,
             "data_scope": data_scope or ["*"],
-            "iat": issued_at,
-            "exp": expires_at,
+            "iat": int(issued_ts),
+            "exp": int(expires_ts),
             "max_uses": max_uses,
             "self_destruct": True
         }
         
-        # Generate the JWT
-        token = jwt.encode(payload, settings.secret_key, algorithm=settings.algorithm)
+        # Generate the JWT (HMAC-signed directly, without PyJWT's generic path)
+        token = encode_token(payload)
         
         # Store token metadata for tracking
         self.active_tokens[token_id] = {
             "user_id": user_id,
             "task_id": task_id,
             "task_type": task_type,
-            "issued_at": issued_at,
-            "expires_at": expires_at,
+            "issued_ts": issued_ts,
+            "expires_ts": expires_ts,
             "max_uses": max_uses,
             "current_uses": 0,
             "data_scope": data_scope or ["*"],
             "status": "active",
-            "access_log": []
+            "access_log": deque(maxlen=self.ACCESS_LOG_SIZE)
         }
+        self._tokens_by_user.setdefault(user_id, {})[token_id] = None
+        self._tokens_by_task.setdefault(task_id, {})[token_id] = None
         
         return {
             "token": token,
             "token_id": token_id,
             "task_id": task_id,
-            "expires_at": expires_at.isoformat(),
+            "expires_at": _to_iso(expires_ts),
             "max_ttl_seconds": max_ttl_seconds,
             "max_uses": max_uses,
             "data_scope": data_scope or ["*"],
@@ -101,6 +217,24 @@ class SelfDestructingTokenManager:
             }
         }
     
+    def _decode_token(self, token: str) -> Dict[str, Any]:
+        """Verify and decode a token, reusing the payload of a recently verified one."""
+        key = hashlib.sha256(token.encode()).digest()
+        
+        with self._verified_lock:
+            payload = self._verified.get(key)
+        
+        if payload is not None and payload["exp"] > time.time():
+            return payload
+        
+        # Expired or unseen tokens go through PyJWT, which raises on failure
+        payload = jwt.decode(token, _SECRET, algorithms=_ALGORITHMS)
+        
+        with self._verified_lock:
+            self._verified[key] = payload
+        
+        return payload
+    
     def validate_and_consume(self, token: str) -> Dict[str, Any]:
         """
         Validate a self-destructing token and consume one use.
@@ -109,55 +243,37 @@ class SelfDestructingTokenManager:
             Validation result with remaining uses or destruction status
         """
         try:
-            payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+            payload = self._decode_token(token)
             token_id = payload.get("token_id")
             
             # Check if token is revoked
             if token_id in self.revoked_tokens:
-                return {
-                    "valid": False,
-                    "reason": "Token has been destroyed (revoked)",
-                    "destroyed": True
-                }
+                return dict(_REVOKED_RESULT)
             
             # Check if token exists in active store
-            if token_id not in self.active_tokens:
-                return {
-                    "valid": False,
-                    "reason": "Token not found or already destroyed",
-                    "destroyed": True
-                }
-            
-            token_data = self.active_tokens[token_id]
+            token_data = self.active_tokens.get(token_id)
+            if token_data is None:
+                return dict(_NOT_FOUND_RESULT)
             
             # Check expiry
-            if datetime.utcnow() > token_data["expires_at"]:
+            if time.time() > token_data["expires_ts"]:
                 self._destroy_token(token_id, "TTL expired")
-                return {
-                    "valid": False,
-                    "reason": "Token self-destructed (TTL expired)",
-                    "destroyed": True
-                }
+                return dict(_EXPIRED_RESULT)
             
             # Check usage count
             if token_data["current_uses"] >= token_data["max_uses"]:
                 self._destroy_token(token_id, "Max uses reached")
-                return {
-                    "valid": False,
-                    "reason": "Token self-destructed (max uses reached)",
-                    "destroyed": True
-                }
+                return dict(_MAX_USES_RESULT)
             
             # Consume one use
             token_data["current_uses"] += 1
+            remaining_uses = token_data["max_uses"] - token_data["current_uses"]
             token_data["access_log"].append({
                 "timestamp": datetime.utcnow().isoformat(),
                 "action": "data_access",
-                "remaining_uses": token_data["max_uses"] - token_data["current_uses"]
+                "remaining_uses": remaining_uses
             })
             
-            remaining_uses = token_data["max_uses"] - token_data["current_uses"]
-            
             # Auto-destroy if this was the last use
             if remaining_uses == 0:
                 self._destroy_token(token_id, "All uses consumed")
@@ -179,7 +295,7 @@ class SelfDestructingTokenManager:
                 "user_id": payload.get("user_id")
             }
             
-        except JWTError as e:
+        except jwt.InvalidTokenError as e:
             return {
                 "valid": False,
                 "reason": f"Invalid token: {str(e)}",
@@ -196,46 +312,79 @@ class SelfDestructingTokenManager:
         Returns:
             Destruction summary
         """
-        destroyed_tokens = []
-        
-        for token_id, token_data in list(self.active_tokens.items()):
-            if token_data.get("task_id") == task_id:
-                self._destroy_token(token_id, f"Task {task_id} completed")
-                destroyed_tokens.append(token_id)
+        destroyed_tokens = list(self._tokens_by_task.pop(task_id, ()))
+        destroyed_at = self._destroy_tokens(destroyed_tokens, f"Task {task_id} completed")
         
         return {
             "task_id": task_id,
             "tokens_destroyed": len(destroyed_tokens),
             "destruction_reason": "task_completion",
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": destroyed_at.isoformat()
         }
     
     def _destroy_token(self, token_id: str, reason: str):
         """Internal method to destroy a token."""
-        if token_id in self.active_tokens:
-            token_data = self.active_tokens[token_id]
+        self._destroy_tokens((token_id,), reason)
+    
+    def _destroy_tokens(self, token_ids: Iterable[str], reason: str) -> datetime:
+        """Destroy several tokens as one batch and return the destruction time."""
+        # One clock read and one revoked-set update for the whole batch
+        destroyed_at = datetime.utcnow()
+        revoked = []
+        
+        for token_id in token_ids:
+            # pop rather than check-then-delete, so a sweep racing a request is harmless
+            token_data = self.active_tokens.pop(token_id, None)
+            if token_data is None:
+                continue
+            
             token_data["status"] = "destroyed"
-            token_data["destroyed_at"] = datetime.utcnow()
+            token_data["destroyed_at"] = destroyed_at
             token_data["destruction_reason"] = reason
+            revoked.append(token_id)
+            heapq.heappush(self._revocation_heap, (token_data["expires_ts"], token_id))
             
-            # Move to revoked list
-            self.revoked_tokens.add(token_id)
+            # Removed from active, but kept in the bounded audit log
+            self.destroyed_tokens.append({"token_id": token_id, **token_data})
             
-            # Remove from active (keep for audit if needed)
-            del self.active_tokens[token_id]
+            self._unindex(self._tokens_by_user, token_data["user_id"], token_id)
+            self._unindex(self._tokens_by_task, token_data["task_id"], token_id)
+        
+        # Move to revoked list
+        self.revoked_tokens.update(revoked)
+        self._expire_revocations(time.time())
+        
+        return destroyed_at
+    
+    def _expire_revocations(self, now: float):
+        """Forget revocations of tokens whose own expiry has passed."""
+        heap = self._revocation_heap
+        while heap and heap[0][0] < now:
+            _, token_id = heapq.heappop(heap)
+            self.revoked_tokens.discard(token_id)
+    
+    @staticmethod
+    def _unindex(index: Dict[str, Dict[str, None]], key: str, token_id: str):
+        """Remove a token_id from a secondary index, dropping emptied keys."""
+        token_ids = index.get(key)
+        if token_ids is not None:
+            token_ids.pop(token_id, None)
+            if not token_ids:
+                del index[key]
     
     def get_token_status(self, token_id: str) -> Dict[str, Any]:
         """Get the current status of a token."""
         if token_id in self.revoked_tokens:
             return {"status": "destroyed", "token_id": token_id}
         
-        if token_id in self.active_tokens:
-            data = self.active_tokens[token_id]
+        # One lookup: the sweeper may destroy the token between a check and an index
+        data = self.active_tokens.get(token_id)
+        if data is not None:
             return {
                 "status": data["status"],
                 "token_id": token_id,
                 "remaining_uses": data["max_uses"] - data["current_uses"],
-                "expires_at": data["expires_at"].isoformat(),
+                "expires_at": _to_iso(data["expires_ts"]),
                 "task_id": data["task_id"]
             }
         
@@ -243,16 +392,22 @@ class SelfDestructingTokenManager:
     
     def get_active_tokens_for_user(self, user_id: str) -> list:
         """Get all active tokens for a user."""
-        return [
-            {
+        tokens = []
+        
+        # Walk the user's own index instead of every active token
+        for tid in list(self._tokens_by_user.get(user_id, ())):
+            # A token being destroyed leaves active_tokens before the user index
+            data = self.active_tokens.get(tid)
+            if data is None:
+                continue
+            tokens.append({
                 "token_id": tid,
                 "task_id": data["task_id"],
                 "remaining_uses": data["max_uses"] - data["current_uses"],
-                "expires_at": data["expires_at"].isoformat()
-            }
-            for tid, data in self.active_tokens.items()
-            if data["user_id"] == user_id
-        ]
+                "expires_at": _to_iso(data["expires_ts"])
+            })
+        
+        return tokens
 
 
 # Singleton instance
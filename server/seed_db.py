@@ -13,11 +13,11 @@ import os
 # Add server directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app.core.database import engine, SessionLocal, Base
+from app.core.database import engine, Base
 from app.models.audit_log import AuditLog
 from datetime import datetime, timedelta
 import random
-import uuid
+import secrets
 
 
 # Sample audit log entries for demo
@@ -46,45 +46,30 @@ def clear_database():
 def seed_audit_logs():
     """Seed the database with sample audit logs."""
     print("\nSeeding audit logs...")
-    db = SessionLocal()
+    now = datetime.utcnow()
+    
+    rows = [
+        {
+            **log,
+            # 0-30 days plus 0-23 hours back is one uniform draw over 31 * 24 hours
+            "timestamp": now - timedelta(hours=random.randrange(31 * 24)),
+            "risk_score": log["risk_score"] + random.uniform(-0.1, 0.1),
+            "request_metadata": {"ip": f"192.168.{random.randint(1,255)}.{random.randint(1,255)}", "session": secrets.token_hex(4)}
+        }
+        for log in SAMPLE_LOGS * 5
+    ]
     
     try:
-        for i, log in enumerate(SAMPLE_LOGS * 5):
-            days_ago = random.randint(0, 30)
-            hours_ago = random.randint(0, 23)
-            timestamp = datetime.utcnow() - timedelta(days=days_ago, hours=hours_ago)
-            
-            audit = AuditLog(
-                timestamp=timestamp,
-                requester_id=log["requester_id"],
-                requester_role=log["requester_role"],
-                purpose=log["purpose"],
-                location=log["location"],
-                data_sensitivity=log["data_sensitivity"],
-                decision=log["decision"],
-                reason=log["reason"],
-                risk_score=log["risk_score"] + random.uniform(-0.1, 0.1),
-                request_metadata={"ip": f"192.168.{random.randint(1,255)}.{random.randint(1,255)}", "session": str(uuid.uuid4())[:8]}
-            )
-            db.add(audit)
-        
-        db.commit()
-        print("Seeded 50 audit log entries")
+        # One Core executemany, skipping per-row ORM object and flush overhead
+        with engine.begin() as conn:
+            conn.execute(AuditLog.__table__.insert(), rows)
+        print(f"Seeded {len(rows)} audit log entries")
     except Exception as e:
         print(f"Error seeding audit logs: {e}")
-        db.rollback()
-    finally:
-        db.close()
 
 
 def print_demo_credentials():
     """Print demo user credentials for easy reference."""
-    print("\n" + "=" * 60)
-    print("  DEMO USER CREDENTIALS")
-    print("=" * 60)
-    print("\n  Use these credentials to login to the Privy dashboard:\n")
-    print(f"  {'Username':<12} {'Password':<15} {'Role':<10} {'Name'}")
-    print(f"  {'-'*12} {'-'*15} {'-'*10} {'-'*20}")
     users = [
         ("rajat", "rajat123", "admin", "Rajat Sharma"),
         ("priya", "priya123", "analyst", "Priya Patel"),
@@ -92,16 +77,23 @@ def print_demo_credentials():
         ("kavya", "kavya123", "external", "Kavya Krishnan"),
         ("vikram", "vikram123", "external", "Vikram Reddy"),
     ]
-    for u, p, r, n in users:
-        print(f"  {u:<12} {p:<15} {r:<10} {n}")
-    print("\n" + "=" * 60)
+    # Built up and written once rather than one print per line
+    lines = [
+        "\n" + "=" * 60,
+        "  DEMO USER CREDENTIALS",
+        "=" * 60,
+        "\n  Use these credentials to login to the Privy dashboard:\n",
+        f"  {'Username':<12} {'Password':<15} {'Role':<10} {'Name'}",
+        f"  {'-'*12} {'-'*15} {'-'*10} {'-'*20}",
+    ]
+    lines.extend(f"  {u:<12} {p:<15} {r:<10} {n}" for u, p, r, n in users)
+    lines.append("\n" + "=" * 60)
+    print("\n".join(lines))
 
 
 def main():
     """Main function to seed the database."""
-    print("\n" + "=" * 60)
-    print("  PRIVY DATABASE SEED SCRIPT")
-    print("=" * 60)
+    print("\n" + "=" * 60 + "\n  PRIVY DATABASE SEED SCRIPT\n" + "=" * 60)
     
     clear_database()
     seed_audit_logs()
@@ -5,69 +5,126 @@ Run this after starting the server with: uvicorn app.main:app --reload
 """
 
 import requests
+import base64
 import json
-from typing import Dict, Any
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
 
 BASE_URL = "http://localhost:8000"
 API_BASE = f"{BASE_URL}/api"
 
+# One keep-alive session, so every call reuses the same connection
+SESSION = requests.Session()
+
+
+class TokenReusePolicy:
+    """Decide whether a previously issued access token can be reused."""
+    
+    def __init__(self, min_remaining_seconds: int = 60):
+        self.min_remaining_seconds = min_remaining_seconds
+    
+    def should_reuse(self, token: Optional[str]) -> bool:
+        """Reuse a token until it is within min_remaining_seconds of its exp (read locally, unverified)."""
+        if not token:
+            return False
+        
+        try:
+            segment = token.split(".")[1]
+            payload = json.loads(base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4)))
+        except (IndexError, ValueError):
+            return False
+        
+        exp = payload.get("exp") if isinstance(payload, dict) else None
+        return isinstance(exp, (int, float)) and exp - time.time() > self.min_remaining_seconds
+
+
+TOKEN_POLICY = TokenReusePolicy()
+
+# Last access token issued per username
+_cached_tokens: Dict[str, str] = {}
+
 
 def print_section(title: str):
     """Print a section header."""
-    print(f"\n{'='*60}")
-    print(f"  {title}")
-    print(f"{'='*60}\n")
+    print(f"\n{'='*60}\n  {title}\n{'='*60}\n")
 
 
 def print_response(response: requests.Response):
     """Pretty print API response."""
-    print(f"Status: {response.status_code}")
     try:
-        print(f"Response:\n{json.dumps(response.json(), indent=2)}")
+        body = f"Response:\n{json.dumps(response.json(), indent=2)}"
     except:
-        print(f"Response: {response.text}")
+        body = f"Response: {response.text}"
+    print(f"Status: {response.status_code}\n{body}")
 
 
 def test_health_check():
     """Test health check endpoint."""
     print_section("1. Health Check")
-    response = requests.get(f"{API_BASE}/health")
+    response = SESSION.get(f"{API_BASE}/health")
     print_response(response)
     return response.status_code == 200
 
 
 def test_login(username: str, password: str) -> str:
-    """Test login and return access token."""
+    """Test login and return access token, reusing a cached one while it is still fresh."""
     print_section(f"2. Login as {username}")
-    response = requests.post(
+    
+    cached = _cached_tokens.get(username)
+    if TOKEN_POLICY.should_reuse(cached):
+        print("Reusing cached access token")
+        return cached
+    
+    response = SESSION.post(
         f"{API_BASE}/auth/login",
         json={"username": username, "password": password}
     )
     print_response(response)
     
     if response.status_code == 200:
-        return response.json()["access_token"]
+        token = _cached_tokens[username] = response.json()["access_token"]
+        return token
     return None
 
 
-def test_request_data(token: str, request_data: Dict[str, Any]):
-    """Test data access request."""
-    print_section("3. Data Access Request")
-    print(f"Request: {json.dumps(request_data, indent=2)}\n")
-    
-    response = requests.post(
+def post_request_data(token: str, request_data: Dict[str, Any]) -> requests.Response:
+    """Send a data access request."""
+    return SESSION.post(
         f"{API_BASE}/request-data",
         json=request_data,
         headers={"Authorization": f"Bearer {token}"}
     )
+
+
+def report_request_data(request_data: Dict[str, Any], response: requests.Response):
+    """Print a data access request and its response."""
+    print_section("3. Data Access Request")
+    print(f"Request: {json.dumps(request_data, indent=2)}\n")
     print_response(response)
     return response.status_code == 200
 
 
+def test_request_data(token: str, request_data: Dict[str, Any]):
+    """Test data access request."""
+    return report_request_data(request_data, post_request_data(token, request_data))
+
+
+def test_scenarios_concurrently(token: str, scenarios: List[Dict[str, Any]]):
+    """Send all scenarios at once, then report them in order."""
+    # The scenarios are independent, so wall time is the slowest request, not the sum
+    with ThreadPoolExecutor(max_workers=len(scenarios)) as pool:
+        responses = list(pool.map(lambda scenario: post_request_data(token, scenario["data"]), scenarios))
+    
+    for scenario, response in zip(scenarios, responses):
+        print_section(f"Test: {scenario['name']}")
+        report_request_data(scenario["data"], response)
+
+
 def test_audit_logs(token: str):
     """Test audit logs retrieval."""
     print_section("4. Audit Logs")
-    response = requests.get(
+    response = SESSION.get(
         f"{API_BASE}/audit-logs?limit=5",
         headers={"Authorization": f"Bearer {token}"}
     )
@@ -78,7 +135,7 @@ def test_audit_logs(token: str):
 def test_audit_stats(token: str):
     """Test audit statistics."""
     print_section("5. Audit Statistics")
-    response = requests.get(
+    response = SESSION.get(
         f"{API_BASE}/audit-logs/stats",
         headers={"Authorization": f"Bearer {token}"}
     )
@@ -145,20 +202,20 @@ def main():
             }
         ]
         
-        for scenario in test_scenarios:
-            print_section(f"Test: {scenario['name']}")
-            test_request_data(admin_token, scenario["data"])
+        test_scenarios_concurrently(admin_token, test_scenarios)
         
         test_audit_logs(admin_token)
         test_audit_stats(admin_token)
         
         print_section("✅ All Tests Completed")
-        print("\nTest Summary:")
-        print("- Health check: ✓")
-        print("- Authentication: ✓")
-        print("- Data access requests: ✓")
-        print("- Audit logs: ✓")
-        print("- Audit statistics: ✓")
+        print("\n".join([
+            "\nTest Summary:",
+            "- Health check: ✓",
+            "- Authentication: ✓",
+            "- Data access requests: ✓",
+            "- Audit logs: ✓",
+            "- Audit statistics: ✓"
+        ]))
         
     except requests.exceptions.ConnectionError:
         print("\n❌ Could not connect to server.")